@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import deque
+
+# Danh sách quyền vào phòng cho đầu đọc thẻ: uid -> phòng được vào (+ cờ admin: không bị khoá giờ),
+# khung giờ khoá, cờ khẩn cấp. Mỗi thay đổi tăng version; đầu đọc giữ bản sao, hỏi lại bằng ?since=<version>
+# và chỉ nhận các uid đã đổi (hoặc 304 nếu không có gì mới). Version có dạng "<epoch>.<số>": epoch đổi
+# mỗi lần khởi động server, đầu đọc gửi version của lần chạy trước sẽ nhận lại bản đầy đủ.
+MAX_CHANGES = int(os.environ.get('TIMEKEEPER_ACCESS_MAX_CHANGES', 10000))   # Số thay đổi giữ lại để trả delta
+
+
+def entry(user):
+    e = {'rooms': sorted(user.get('allowed_rooms') or [])}
+    if user.get('role') == 'admin': e['admin'] = 1
+    return e
+
+
+class AccessList:
+    def __init__(self, lockout, max_changes=MAX_CHANGES):
+        self.lockout = list(lockout)
+        self.max_changes = max_changes
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self.floor = 0          # Delta chỉ trả được cho since >= floor
+        self.users = {}
+        self.emergency = False
+        self.changes = deque()  # (version, uid)
+        self.cached = None      # (version, snapshot) của lần hỏi gần nhất
+        self.lock = threading.Lock()
+
+    def tag(self, version=None):
+        return f'{self.epoch}.{self.version if version is None else version}'
+
+    def reset(self, users, emergency):
+        # Dựng lại toàn bộ (khởi động, nạp lại chỉ mục users): đầu đọc phải lấy bản đầy đủ
+        with self.lock:
+            self.users = {u['uid']: entry(u) for u in users if u.get('uid') is not None}
+            self.emergency = bool(emergency)
+            self.version += 1
+            self.floor = self.version
+            self.changes.clear()
+
+    def _bump(self, uid=None):
+        self.version += 1
+        if uid is not None: self.changes.append((self.version, uid))
+        while len(self.changes) > self.max_changes:
+            self.floor = self.changes.popleft()[0]
+
+    def set_user(self, user):
+        uid = user.get('uid')
+        if uid is None: return
+        e = entry(user)
+        with self.lock:
+            if self.users.get(uid) == e: return
+            self.users[uid] = e
+            self._bump(uid)
+
+    def remove(self, uid):
+        with self.lock:
+            if self.users.pop(uid, None) is None: return
+            self._bump(uid)
+
+    def set_emergency(self, active):
+        with self.lock:
+            if self.emergency == bool(active): return
+            self.emergency = bool(active)
+            self._bump()
+
+    def snapshot(self):
+        with self.lock:
+            if not self.cached or self.cached[0] != self.version:
+                self.cached = (self.version, {'version': self.tag(), 'full': True, 'lockout': self.lockout,
+                                              'emergency': self.emergency, 'users': dict(self.users)})
+            return self.cached[1]
+
+    def delta(self, since):
+        # Các uid đổi sau version since (None = đã bị xoá); None nếu since không còn dùng được => gửi bản đầy đủ
+        epoch, _, number = (since or '').partition('.')
+        if epoch != self.epoch or not number.isdigit(): return None
+        since = int(number)
+        with self.lock:
+            if since < self.floor or since > self.version: return None
+            changed = set()
+            for version, uid in reversed(self.changes):
+                if version <= since: break
+                changed.add(uid)
+            return {'version': self.tag(), 'since': self.tag(since), 'full': False, 'lockout': self.lockout,
+                    'emergency': self.emergency, 'users': {uid: self.users.get(uid) for uid in changed}}
@@ -0,0 +1,102 @@
+import array
+import json
+import os
+import sys
+from bisect import bisect_left
+from records import ACTIONS, ACTION_CODES, ROOMS, LogColumns, room_code, to_us
+
+# Logs của 1 tháng đã chốt lương được đóng băng thành 1 file bất biến: <thư mục>/YYYY-MM.bin
+#   dòng 1: header JSON {month, count, users, offsets, actions, rooms, byteorder}
+#   sau đó: mảng thời gian (epoch micro giây, int64), mảng mã hành động (int8), mảng mã phòng (uint16, tên trong header;
+#   file ghi trước khi lưu phòng không có phần này)
+# Logs sắp theo (user, thời gian); logs của users[i] nằm trong [offsets[i], offsets[i+1]).
+
+
+def month_name(month):
+    return f'{month[0]:04d}-{month[1]:02d}'
+
+
+class MonthArchive:
+    def __init__(self, month, users, offsets, ts, actions, rooms):
+        self.month = month
+        self.users = users
+        self.index = {u: i for i, u in enumerate(users)}
+        self.offsets = offsets
+        self.ts = ts
+        self.actions = actions
+        self.rooms = rooms
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def build(cls, month, columns):
+        # columns: {username: LogColumns}
+        users = sorted(u for u, c in columns.items() if c)
+        merged, offsets = LogColumns(), []
+        for u in users:
+            offsets.append(len(merged))
+            merged.extend(columns[u])
+        offsets.append(len(merged))
+        return cls(month, users, offsets, merged.ts, merged.actions, merged.rooms)
+
+    @staticmethod
+    def path(directory, month):
+        return os.path.join(directory, month_name(month) + '.bin')
+
+    @staticmethod
+    def _read_header(f):
+        return json.loads(f.readline())
+
+    @staticmethod
+    def read_count(path):
+        with open(path, 'rb') as f: return MonthArchive._read_header(f)['count']
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = cls._read_header(f)
+            ts, actions, rooms = array.array('q'), array.array('b'), array.array('H')
+            ts.frombytes(f.read(8 * header['count']))
+            actions.frombytes(f.read(header['count']))
+            if 'rooms' in header: rooms.frombytes(f.read(2 * header['count']))
+            else: rooms = array.array('H', bytes(2 * header['count']))
+        if header['byteorder'] != sys.byteorder: ts.byteswap(); rooms.byteswap()
+        if tuple(header['actions']) != ACTIONS:
+            # File ghi với bảng mã hành động khác: đổi về mã hiện tại
+            remap = [ACTION_CODES[a] for a in header['actions']]
+            actions = array.array('b', (remap[a] for a in actions))
+        if header.get('rooms') and [room_code(r) for r in header['rooms']] != list(range(len(header['rooms']))):
+            # Mã phòng trong file khác mã phòng của process này: đổi lại
+            remap = [room_code(r) for r in header['rooms']]
+            rooms = array.array('H', (remap[r] for r in rooms))
+        return cls(tuple(header['month']), header['users'], header['offsets'], ts, actions, rooms)
+
+    def save(self, directory):
+        # Ghi file tạm rồi đổi tên: crash giữa chừng không làm hỏng bản cũ
+        os.makedirs(directory, exist_ok=True)
+        rooms = ROOMS[:max(self.rooms, default=0) + 1]
+        header = {'month': list(self.month), 'count': len(self.ts), 'users': self.users, 'offsets': self.offsets,
+                  'actions': list(ACTIONS), 'rooms': rooms, 'byteorder': sys.byteorder}
+        path = self.path(directory, self.month)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+            f.write(self.ts.tobytes()); f.write(self.actions.tobytes()); f.write(self.rooms.tobytes())
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def slice(self, username, start=None, end=None):
+        # LogColumns của user trong [start, end)
+        i = self.index.get(username)
+        if i is None: return LogColumns()
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        if start: lo = bisect_left(self.ts, to_us(start), lo, hi)
+        if end: hi = bisect_left(self.ts, to_us(end), lo, hi)
+        return LogColumns(self.ts[lo:hi], self.actions[lo:hi], self.rooms[lo:hi])
+
+    def contains(self, username, t, code):
+        return self.slice(username).contains(t, code)
+
+    def by_user(self):
+        return {u: self.slice(u) for u in self.users}
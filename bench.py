@@ -0,0 +1,444 @@
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Bộ đo hiệu năng: tạo dữ liệu giả qua API của db.py, đo các hàm đọc/tính lương và các lời gọi db mà
+# dashboard dùng khi dựng trang (không đo phần vẽ widget, cần client NiceGUI), phát lại chuỗi quẹt thẻ
+# vào /check theo tốc độ đặt trước. Kết quả ghi ra JSON để so giữa các commit.
+#   python bench.py seed --users 10000 --days 730
+#   python bench.py offline --out before.json
+#   python bench.py replay --rate 200 --duration 30 --out before.json
+#   python bench.py compare before.json after.json
+# Dữ liệu nằm trong --dir (mặc định bench_data/), không đụng tới db.json đang dùng.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ROOMS = ['p1', 'p2', 'p3', 'p4', 'p5']
+
+
+def use_dir(args):
+    # Trỏ storage của db.py vào thư mục bench (phải gọi trước khi import db)
+    path = os.path.abspath(args.dir)
+    os.makedirs(path, exist_ok=True)
+    env = {
+        'TIMEKEEPER_STORAGE': args.storage,
+        'TIMEKEEPER_DB': os.path.join(path, 'db.json'),
+        'TIMEKEEPER_LOG_DIR': os.path.join(path, 'logs'),
+        'TIMEKEEPER_SQLITE': os.path.join(path, 'timekeeper.sqlite3'),
+    }
+    os.environ.update(env)
+    return path, env
+
+
+def storage_bytes(path):
+    total = 0
+    for base, _, files in os.walk(path):
+        for name in files:
+            try: total += os.path.getsize(os.path.join(base, name))
+            except OSError: pass
+    return total
+
+
+def percentiles(samples):
+    if not samples: return {'count': 0}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {
+        'count': len(s),
+        'mean_ms': round(sum(s) / len(s) * 1000, 3),
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+        'max_ms': round(s[-1] * 1000, 3),
+    }
+
+
+def max_rss_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def git_commit():
+    try: return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception: return None
+
+
+def save(args, section, result):
+    # Gộp kết quả vào file --out (mỗi lệnh 1 mục), giữ các mục đã có
+    if not args.out: return
+    data = {}
+    if os.path.exists(args.out):
+        with open(args.out, encoding='utf-8') as f: data = json.load(f)
+    data.update({'commit': git_commit(), 'storage': args.storage, 'updated': datetime.now().isoformat(timespec='seconds')})
+    data[section] = result
+    with open(args.out, 'w', encoding='utf-8') as f: json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"Đã ghi {section} vào {args.out}")
+
+
+# --- Tạo dữ liệu ---
+def make_users(n, rng):
+    users = []
+    for i in range(n):
+        rooms = sorted(rng.sample(ROOMS, rng.randint(1, 3)))
+        users.append({
+            'username': f'bench{i:05d}',
+            'name': f'Bench User {i}',
+            'role': 'user',
+            'uid': f'{i:08x}',
+            'salary': rng.choice([25000, 50000, 55000, 80000, 150000]),
+            'position': 'Staff',
+            'allowed_rooms': rooms,
+            # Ca đêm với ~5% nhân viên để có log qua nửa đêm / hệ số đêm
+            'night': rng.random() < 0.05,
+        })
+    return users
+
+
+def cmd_seed(args):
+    path, _ = use_dir(args)
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    import db
+    db.reset_data()
+    users = make_users(args.users, rng)
+    # Không đặt mật khẩu: băm pbkdf2 cho hàng nghìn user chiếm gần hết thời gian tạo dữ liệu,
+    # user bench không đăng nhập
+    with db.transaction():
+        for u in users:
+            db.create_user({k: v for k, v in u.items() if k != 'night'})
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day, logs = end - timedelta(days=args.days), 0
+    while day < end:
+        weekend = day.weekday() >= 5
+        with db.transaction():
+            for u in users:
+                if rng.random() > (0.2 if weekend else 0.9): continue
+                if u['night']:
+                    t_in = day.replace(hour=22) + timedelta(minutes=rng.randint(0, 30))
+                    t_out = t_in + timedelta(hours=8, minutes=rng.randint(0, 20))
+                else:
+                    t_in = day.replace(hour=7) + timedelta(minutes=rng.randint(0, 120))
+                    t_out = day.replace(hour=16) + timedelta(minutes=rng.randint(0, 180))
+                db.add_log(u['username'], 'in', t_in)
+                db.add_log(u['username'], 'out', t_out)
+                logs += 2
+        day += timedelta(days=1)
+    db.store.close()
+    result = {
+        'users': args.users, 'days': args.days, 'logs': logs,
+        'seconds': round(time.perf_counter() - t0, 3),
+        'storage_bytes': storage_bytes(path),
+    }
+    print(f"Tạo {args.users} user, {logs} log trong {result['seconds']}s ({result['storage_bytes']:,} bytes)")
+    save(args, 'seed', result)
+
+
+# --- Đo các hàm đọc ---
+def timed(fn, items, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for item in items:
+            t = time.perf_counter(); fn(item); samples.append(time.perf_counter() - t)
+    return percentiles(samples)
+
+
+def cmd_offline(args):
+    path, _ = use_dir(args)
+    t0 = time.perf_counter()
+    import db
+    import payroll
+    load, rss = time.perf_counter() - t0, max_rss_kb()
+    users = [u['username'] for u in db.get_all_users() if u.get('role') != 'admin']
+    if not users: sys.exit('Chưa có dữ liệu, chạy "python bench.py seed" trước')
+    rng = random.Random(args.seed)
+    sample = rng.sample(users, min(args.sample, len(users)))
+    now = db.state.get_current_time()
+    y, m, today = now.year, now.month, now.date()
+
+    def user_dashboard(username):
+        # Dữ liệu mà user_dashboard trong main.py dựng khi mở trang
+        db.get_month_summary(username, y, m)
+        rows = [{'timestamp': datetime.fromisoformat(l['timestamp']).strftime('%Y-%m-%d %H:%M:%S'), 'action': 'VÀO' if l['action'] == 'in' else 'RA'} for l in db.get_logs_by_month(username, y, m)]
+        db.calculate_salary(username, m, y)
+        db.get_daily_hours(username, today, 7)
+        return rows
+
+    def admin_dashboard(_):
+        # refresh_list: mỗi dòng 1 lần tính lương tháng hiện tại
+        for u in db.get_all_users(): db.calculate_salary(u['username'], m, y)
+
+    result = {'load_seconds': round(load, 3), 'load_max_rss_kb': rss, 'users': len(users), 'sample': len(sample), 'storage_bytes': storage_bytes(path)}
+    # cold: xoá tổng hợp trước mỗi lần gọi (lần đầu mở trang sau khởi động), warm: đã có tổng hợp
+    cold = lambda fn: (lambda u: (db.invalidate_aggregates(u), fn(u)))
+    result['calculate_salary_cold'] = timed(cold(lambda u: db.calculate_salary(u, m, y)), sample)
+    result['calculate_salary_warm'] = timed(lambda u: db.calculate_salary(u, m, y), sample, args.repeat)
+    result['month_summary_warm'] = timed(lambda u: db.get_month_summary(u, y, m), sample, args.repeat)
+    result['daily_hours_warm'] = timed(lambda u: db.get_daily_hours(u, today, 7), sample, args.repeat)
+    result['logs_by_month'] = timed(lambda u: db.get_logs_by_month(u, y, m), sample, args.repeat)
+    result['logs_by_username'] = timed(db.get_logs_by_username, sample)
+    result['user_dashboard_cold'] = timed(cold(user_dashboard), sample)
+    result['user_dashboard_warm'] = timed(user_dashboard, sample, args.repeat)
+    result['admin_dashboard'] = timed(admin_dashboard, [None], args.repeat)
+    result['run_payroll'] = timed(lambda _: payroll.run_payroll(y, m), [None], args.repeat)
+    for name, value in result.items():
+        if isinstance(value, dict): print(f"{name:24s} p50={value['p50_ms']}ms p95={value['p95_ms']}ms p99={value['p99_ms']}ms")
+        else: print(f"{name:24s} {value}")
+    save(args, 'offline', result)
+
+
+# --- Bảng hệ số lương ---
+def legacy_multiplier(t, holidays=((1, 1), (4, 30), (5, 1), (9, 2))):
+    # Cách tính cũ: cả ca lấy hệ số theo giờ checkout
+    if (t.month, t.day) in holidays: return 3.0
+    if t.weekday() >= 5: return 2.0
+    if t.hour >= 18 or t.hour < 6: return 1.5
+    return 1.0
+
+
+def cmd_payrules(args):
+    use_dir(args)
+    import numpy as np
+    import payroll
+    from payrules import PayRules
+    from records import to_us
+    rng = random.Random(args.seed)
+    start = datetime(datetime.now().year, 1, 1)
+    shifts = []
+    for _ in range(args.shifts):
+        t_in = start + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        shifts.append((t_in, t_in + timedelta(minutes=rng.randrange(60, 14 * 60))))
+    us = [(to_us(a), to_us(b)) for a, b in shifts]
+    t_in, t_out = np.array([a for a, _ in us], dtype=np.int64), np.array([b for _, b in us], dtype=np.int64)
+
+    def run(fn):
+        samples = []
+        for _ in range(args.repeat):
+            t = time.perf_counter(); value = fn(); samples.append(time.perf_counter() - t)
+        return min(samples), value
+
+    rules = PayRules()
+    compile_s = run(lambda: rules._compile(start.year))[0]
+    legacy_s, legacy = run(lambda: [(b - a).total_seconds() / 3600 * legacy_multiplier(b) for a, b in shifts])
+    split_s, exact = run(lambda: [rules.weighted_hours(a, b) for a, b in us])
+    bulk_s, bulk = run(lambda: payroll.weighted_hours(t_in, t_out))
+    n = len(shifts)
+    result = {
+        'shifts': n,
+        'segments_per_shift': round(sum(len(rules.segments(a, b)) for a, b in us) / n, 2),
+        'compile_year_ms': round(compile_s * 1000, 3),
+        'legacy_loop_ns': round(legacy_s / n * 1e9),
+        'split_ns': round(split_s / n * 1e9),
+        'bulk_numpy_ns': round(bulk_s / n * 1e9),
+        'bulk_matches_split': bool(np.array_equal(bulk, np.array(exact))),
+        'repriced_shifts': sum(1 for x, y in zip(legacy, exact) if abs(x - y) > 1e-9),
+        'weighted_hours_legacy': round(sum(legacy), 1),
+        'weighted_hours_exact': round(sum(exact), 1),
+    }
+    for name, value in result.items(): print(f"{name:24s} {value}")
+    save(args, 'payrules', result)
+
+
+# --- Phát lại quẹt thẻ ---
+def load_trace(path):
+    # Mỗi dòng 1 JSON: body của /check ({"uid", "room"}), body của /check/batch ({"events": [...]} hoặc [...]),
+    # hoặc bọc trong {"body": ...} (body có thể là chuỗi JSON). Dòng không có lần quẹt nào (uid) bị bỏ qua
+    events, skipped = [], 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                body = json.loads(line)
+                if isinstance(body, dict) and 'body' in body: body = body['body']
+                if isinstance(body, str): body = json.loads(body)
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and 'events' in body: body = body['events']
+            found = [{'uid': e['uid'], 'room': e.get('room')} for e in (body if isinstance(body, list) else [body]) if isinstance(e, dict) and e.get('uid')]
+            if found: events.extend(found)
+            else: skipped += 1
+    if skipped: print(f"Bỏ qua {skipped} dòng không có lần quẹt (uid) trong {path}")
+    if not events: sys.exit(f"Không đọc được lần quẹt nào từ {path}")
+    return events
+
+
+def make_trace(args, count):
+    # Chuỗi giả từ user trong thư mục bench: phần lớn quẹt hợp lệ, 1 phần sai phòng / thẻ lạ
+    use_dir(args)
+    import db
+    users = [u for u in db.get_all_users() if u.get('uid')]
+    if not users: sys.exit('Chưa có dữ liệu, chạy "python bench.py seed" trước')
+    rng = random.Random(args.seed)
+    events = []
+    for _ in range(count):
+        r = rng.random()
+        if r < 0.02: events.append({'uid': f'unknown{rng.randint(0, 999)}', 'room': 'p1'})
+        else:
+            u = rng.choice(users)
+            rooms = u.get('allowed_rooms') or ['p1']
+            room = rng.choice([x for x in ROOMS if x not in rooms] or rooms) if r < 0.07 else rng.choice(rooms)
+            events.append({'uid': u['uid'], 'room': room})
+    return events
+
+
+def free_port():
+    # Cổng trống cho server bench: không bao giờ gửi nhầm lần quẹt giả vào server đang chạy ở 8081
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None: sys.exit(f'Server dừng với mã {proc.returncode}')
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0: return
+        time.sleep(0.2)
+    sys.exit('Server không khởi động kịp')
+
+
+def cmd_replay(args):
+    import requests
+    path, env = use_dir(args)
+    count = int(args.rate * args.duration)
+    events = load_trace(args.trace) if args.trace else make_trace(args, count)
+    if not events: sys.exit('Trace rỗng')
+    if args.save_trace:
+        with open(args.save_trace, 'w', encoding='utf-8') as f:
+            for e in events: f.write(json.dumps(e) + '\n')
+
+    proc, url = None, args.url
+    size_before = storage_bytes(path)
+    if not url:
+        # Server riêng chạy trên dữ liệu bench
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, 'main.py'], cwd=ROOT, env=dict(os.environ, TIMEKEEPER_PORT=str(port), **env),
+                                stdout=subprocess.DEVNULL if not args.verbose else None, stderr=subprocess.STDOUT)
+        wait_port(port, proc)
+        url = f'http://127.0.0.1:{port}'
+
+    local = threading.local()
+    statuses, errors, latency, service = {}, [0], [], []
+    lock = threading.Lock()
+
+    def send(event, scheduled):
+        # Độ trễ tính từ thời điểm lẽ ra phải gửi (gồm cả thời gian xếp hàng phía client)
+        session = getattr(local, 'session', None)
+        if session is None: session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = session.post(f'{url}/check', json=event, timeout=30).json().get('status')
+        except Exception:
+            status = None
+        end = time.perf_counter()
+        with lock:
+            if status is None: errors[0] += 1
+            else: statuses[str(status)] = statuses.get(str(status), 0) + 1
+            latency.append(end - scheduled); service.append(end - start)
+
+    try:
+        print(f"Phát lại {len(events)} lần quẹt vào {url}/check với {args.rate}/s...")
+        interval = 1.0 / args.rate
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            t0 = time.perf_counter()
+            for i, event in enumerate(events):
+                scheduled = t0 + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+                pool.submit(send, event, scheduled)
+        elapsed = time.perf_counter() - t0
+        try: cache = requests.get(f'{url}/check/cache', timeout=5).json()
+        except Exception: cache = None
+    finally:
+        if proc:
+            # Dừng êm để server đóng storage (fsync log) trước khi đo dung lượng
+            proc.send_signal(signal.SIGINT)
+            try: proc.wait(timeout=30)
+            except subprocess.TimeoutExpired: proc.kill()
+
+    size_after = storage_bytes(path)
+    result = {
+        'events': len(events), 'target_rate': args.rate, 'concurrency': args.concurrency,
+        'seconds': round(elapsed, 3), 'throughput': round(len(events) / elapsed, 1),
+        'latency': percentiles(latency), 'service_time': percentiles(service),
+        'statuses': statuses, 'errors': errors[0], 'swipe_cache': cache,
+        'storage_bytes_before': size_before, 'storage_bytes_after': size_after,
+        'storage_growth_bytes': size_after - size_before,
+    }
+    lat = result['latency']
+    print(f"throughput={result['throughput']}/s p50={lat['p50_ms']}ms p95={lat['p95_ms']}ms p99={lat['p99_ms']}ms errors={errors[0]}")
+    print(f"storage: {size_before:,} -> {size_after:,} bytes (+{size_after - size_before:,})")
+    save(args, 'replay', result)
+
+
+# --- So sánh 2 lần chạy ---
+def cmd_compare(args):
+    with open(args.before, encoding='utf-8') as f: a = json.load(f)
+    with open(args.after, encoding='utf-8') as f: b = json.load(f)
+    print(f"{a.get('commit')} -> {b.get('commit')}")
+    for section in ('seed', 'offline', 'payrules', 'replay'):
+        if section not in a or section not in b: continue
+        print(f"[{section}]")
+        for name, old in a[section].items():
+            new = b[section].get(name)
+            metrics = [(f'{name}.{k}', v, new.get(k)) for k, v in old.items()] if isinstance(old, dict) and isinstance(new, dict) else [(name, old, new)]
+            for label, x, y in metrics:
+                if not isinstance(x, (int, float)) or not isinstance(y, (int, float)): continue
+                ratio = f"x{y / x:.2f}" if x else ''
+                print(f"  {label:40s} {x:>14} -> {y:<14} {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo hiệu năng hệ thống chấm công')
+    parser.add_argument('--dir', default='bench_data', help='thư mục dữ liệu bench')
+    parser.add_argument('--storage', default=os.environ.get('TIMEKEEPER_STORAGE', 'json'), choices=['json', 'sqlite'])
+    parser.add_argument('--seed', type=int, default=42, help='seed ngẫu nhiên')
+    parser.add_argument('--out', help='file JSON ghi kết quả')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('seed', help='tạo dữ liệu giả')
+    p.add_argument('--users', type=int, default=1000)
+    p.add_argument('--days', type=int, default=365)
+    p.set_defaults(fn=cmd_seed)
+
+    p = sub.add_parser('offline', help='đo tính lương, tổng hợp tháng, lời gọi db của dashboard (không đo vẽ widget)')
+    p.add_argument('--sample', type=int, default=200, help='số user lấy mẫu')
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(fn=cmd_offline)
+
+    p = sub.add_parser('payrules', help='so sánh cắt ca theo bảng hệ số với cách tính cũ theo từng log')
+    p.add_argument('--shifts', type=int, default=100000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(fn=cmd_payrules)
+
+    p = sub.add_parser('replay', help='phát lại quẹt thẻ vào /check')
+    p.add_argument('--trace', help='file JSONL, mỗi dòng 1 body của /check hoặc /check/batch (có thể bọc trong {"body": ...})')
+    p.add_argument('--save-trace', help='lưu chuỗi quẹt đã tạo ra file JSONL')
+    p.add_argument('--url', help='server đang chạy (mặc định tự chạy main.py trên dữ liệu bench)')
+    p.add_argument('--rate', type=float, default=100.0, help='số lần quẹt mỗi giây')
+    p.add_argument('--duration', type=float, default=10.0, help='số giây (khi tự tạo trace)')
+    p.add_argument('--concurrency', type=int, default=64)
+    p.add_argument('--verbose', action='store_true', help='hiện log server')
+    p.set_defaults(fn=cmd_replay)
+
+    p = sub.add_parser('compare', help='so sánh 2 file kết quả')
+    p.add_argument('before'); p.add_argument('after')
+    p.set_defaults(fn=cmd_compare)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == '__main__':
+    main()
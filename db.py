@@ -1,197 +1,586 @@
-from tinydb import TinyDB, Query, where
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
-import os
+from tinydb.table import Document
+from datetime import datetime, date, timedelta
+from contextlib import contextmanager
+from storage import open_storage
+from writer import Writer
+from events import EventBus, ALL
+from records import ACTION_CODES, ONE_US, from_us, to_us
+from payrules import US_PER_HOUR
+from swipe_cache import DEBOUNCE_SECONDS
+from access import AccessList
+import metrics
+import passwords
+import payrules
+import atexit
+import calendar
+import threading
 
-# Setup Database
-db = TinyDB('db.json')
-users_table = db.table('users')
-logs_table = db.table('logs')
-system_table = db.table('system')
+# Setup Database (JSON mặc định, hoặc SQLite qua TIMEKEEPER_STORAGE=sqlite)
+store = open_storage()
+atexit.register(store.close)
+def _on_flush(seconds, nbytes):
+    metrics.STORE_FLUSH_SECONDS.observe(seconds)
+    metrics.STORE_FLUSH_BYTES.observe(nbytes)
+store.on_flush = _on_flush
+# Mọi thao tác ghi chạy tuần tự trên 1 luồng ghi; đọc lấy từ bộ nhớ
+writer = Writer(store.transaction)
+atexit.register(writer.close)
+# Báo thay đổi cho các dashboard đang mở (theo username)
+bus = EventBus()
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+def _publish(username, kind, month=None):
+    # Gửi sau khi transaction commit: dashboard đọc lại (SQLite qua kết nối riêng) luôn thấy dữ liệu mới
+    writer.after_commit(bus.publish, username, kind, month)
+
+
+# Chỉ mục users trong bộ nhớ (nạp 1 lần, đồng bộ qua các hàm ghi bên dưới)
+_users_by_id = {}
+_users_by_uid = {}
+_users_by_username = {}
+
+def _index_user(user):
+    _users_by_id[user.doc_id] = user
+    if user.get('uid') is not None: _users_by_uid[user['uid']] = user
+    if user.get('username') is not None: _users_by_username[user['username']] = user
+
+def _unindex_user(user):
+    _users_by_id.pop(user.doc_id, None)
+    if _users_by_uid.get(user.get('uid')) is user: del _users_by_uid[user['uid']]
+    if _users_by_username.get(user.get('username')) is user: del _users_by_username[user['username']]
+
+def _reindex_user(user, data):
+    # Cập nhật user tại chỗ, chỉ gỡ khoá cũ khi uid/username thay đổi
+    if 'uid' in data and data['uid'] != user.get('uid') and _users_by_uid.get(user.get('uid')) is user: del _users_by_uid[user['uid']]
+    if 'username' in data and data['username'] != user.get('username') and _users_by_username.get(user.get('username')) is user: del _users_by_username[user['username']]
+    user.update(data)
+    _index_user(user)
+
+def _load_user_index():
+    _users_by_id.clear(); _users_by_uid.clear(); _users_by_username.clear()
+    for doc_id, data in store.all_users():
+        _index_user(Document(data, doc_id=doc_id))
+
+_load_user_index()
+metrics.ROWS.set_function(lambda: {('users',): len(_users_by_id), ('logs',): store.count_logs()})
 
 class SystemState:
     def __init__(self):
-        state = system_table.get(doc_id=1)
+        # last_updated chỉ giữ trong bộ nhớ (mốc thay đổi cho client hỏi vòng), không ghi xuống đĩa
+        self.last_updated = datetime.now().timestamp()
+        state = store.get_system()
         if not state:
             self.time_offset_seconds = 0
             self.emergency_mode = False
-            self.last_updated = datetime.now().timestamp()
-            system_table.insert({'time_offset_seconds': 0, 'emergency_mode': False, 'last_updated': self.last_updated})
+            store.set_system({'time_offset_seconds': 0, 'emergency_mode': False})
         else:
             self.time_offset_seconds = state.get('time_offset_seconds', 0)
             self.emergency_mode = state.get('emergency_mode', False)
-            self.last_updated = state.get('last_updated', datetime.now().timestamp())
+
+    def reload(self):
+        # Storage dùng chung: process khác (dashboard / ingest) có thể vừa đổi time offset, chế độ khẩn cấp
+        state = store.get_system() or {}
+        self.time_offset_seconds = state.get('time_offset_seconds', 0)
+        self.emergency_mode = state.get('emergency_mode', False)
 
     def get_current_time(self):
         return datetime.now() + timedelta(seconds=self.time_offset_seconds)
 
+    @writer.serialized
     def set_time_offset(self, seconds):
         self.time_offset_seconds = seconds
-        system_table.update({'time_offset_seconds': seconds}, doc_ids=[1])
+        store.set_system({'time_offset_seconds': seconds})
+        invalidate_aggregates()
         self.trigger_update()
+        _publish(None, 'system')
 
+    @writer.serialized
     def set_emergency(self, is_active):
-        self.emergency_mode = is_active
-        system_table.update({'emergency_mode': is_active}, doc_ids=[1])
-        if is_active:
-            users_table.update({'status': 'checkout'})
-        self.trigger_update()
-            
-    def trigger_update(self):
+        _reload_shared_users()
+        with batch() as b:
+            b.set_system({'emergency_mode': is_active})
+            if is_active:
+                for u in _users_by_id.values():
+                    if u.get('status') != 'checkout': b.update_user(u, {'status': 'checkout'})
+            self.emergency_mode = is_active
+        access.set_emergency(is_active)
+
+    def trigger_update(self, fields=None):
         self.last_updated = datetime.now().timestamp()
-        system_table.update({'last_updated': self.last_updated}, doc_ids=[1])
+        if fields: store.set_system(fields)
 
 state = SystemState()
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # Bản đồng bộ; trong handler async dùng await passwords.verify_password (process pool)
+    return passwords.verify_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return passwords.hash_password_sync(password)
+
+def _take_password(data, keep_empty):
+    # Mật khẩu được băm ở luồng gọi, trước khi xếp hàng vào luồng ghi: KDF không bao giờ chặn các lần quẹt thẻ
+    # đang chờ ghi. Đã băm sẵn (await passwords.hash_password) thì truyền qua 'password_hash'
+    if data.get('password_hash'): data['password'] = data.pop('password_hash')
+    elif data.get('password') or (keep_empty and 'password' in data): data['password'] = get_password_hash(data['password'])
+    else: data.pop('password', None)
+    data.pop('password_hash', None)
 
 def init_db():
-    if not users_table.all():
+    if not _users_by_id:
         # Dữ liệu mẫu sẽ được tạo bởi seed_data.py, hàm này chỉ dự phòng
         pass
 
 def get_user_by_username(username):
-    User = Query()
-    return users_table.get(User.username == username)
+    return _users_by_username.get(username)
 
 def get_user_by_uid(uid):
-    User = Query()
-    return users_table.get(User.uid == uid)
+    return _users_by_uid.get(uid)
 
 def get_all_users():
-    return users_table.all()
+    return list(_users_by_id.values())
+
+def _reload_user(uid=None, username=None):
+    # Đọc lại 1 user từ storage dùng chung (process khác có thể vừa ghi), cập nhật chỉ mục trong bộ nhớ
+    user = _users_by_uid.get(uid) if uid is not None else _users_by_username.get(username)
+    row = store.get_user(uid=uid, username=username)
+    if user and (not row or row[0] != user.doc_id):
+        # User đã bị xoá hoặc khoá đã chuyển sang user khác
+        _unindex_user(user); user = None
+    if not row: return None
+    doc_id, data = row
+    user = user or _users_by_id.get(doc_id) or Document({}, doc_id=doc_id)
+    _unindex_user(user)
+    user.clear(); user.update(data)
+    _index_user(user)
+    return user
 
-def update_user_status(uid, status):
-    User = Query()
-    users_table.update({'status': status}, User.uid == uid)
+def _reload_shared_users():
+    # Storage dùng chung: trạng thái trong bộ nhớ có thể đã cũ (worker khác vừa ghi, mất gói báo thay đổi).
+    # Gọi trong transaction của luồng ghi (SQLite: BEGIN IMMEDIATE đã khoá ghi) => đọc đúng trạng thái hiện tại
+    if not store.shared: return
+    _load_user_index()
+    for user in _users_by_id.values(): access.set_user(user)
+
+@writer.serialized
+def apply_remote_change(event):
+    # Sự kiện từ process khác ghi cùng storage (ingest.py, qua notify.py): nạp lại phần bị đổi, báo các dashboard
+    username, months = event.get('username'), [tuple(m) for m in event.get('months', [])]
+    if username is None:
+        state.reload()
+        _load_user_index()
+        invalidate_aggregates()
+        # Chỉ các uid thực sự đổi mới tăng version (đầu đọc không phải tải lại toàn bộ)
+        access.set_emergency(state.emergency_mode)
+        for user in _users_by_id.values(): access.set_user(user)
+    else:
+        user = _reload_user(username=username)
+        if user: access.set_user(user)
+        with _agg_lock:
+            cached = _aggregates.get(username, {}).get('months', {})
+            for month in months: cached.pop(month, None)
+    for kind in event.get('kinds', []):
+        if kind == 'logs':
+            for month in months: _publish(username, kind, month)
+        else: _publish(username, kind)
+
+@writer.serialized
+def update_user_status(uid, status, extra=None):
+    user = _users_by_uid.get(uid)
+    if not user: return
+    fields = dict(extra or {}, status=status)
+    store.update_user(user.doc_id, fields)
+    user.update(fields)
     state.trigger_update()
+    _publish(user['username'], 'status')
 
 def update_user_details(doc_id, data):
-    if 'password' in data and data['password']:
-         data['password'] = get_password_hash(data['password'])
-    elif 'password' in data:
-        del data['password']
-    users_table.update(data, doc_ids=[doc_id])
+    _take_password(data, keep_empty=False)
+    _update_user_details(doc_id, data)
+
+@writer.serialized
+def _update_user_details(doc_id, data):
+    store.update_user(doc_id, data)
+    user = _users_by_id.get(doc_id)
+    old_username, old_uid = (user.get('username'), user.get('uid')) if user else (None, None)
+    if user:
+        _reindex_user(user, data)
+        access.set_user(user)
+        if user.get('uid') != old_uid: _release_uid(old_uid)
     state.trigger_update()
+    if old_username: _publish(old_username, 'profile')
+    if user and user.get('username') != old_username: _publish(user.get('username'), 'profile')
 
+def _release_uid(uid):
+    # uid có thể trùng giữa nhiều user: 1 user bỏ uid (sửa / xoá) thì user còn lại giữ uid vẫn quẹt được
+    # và vẫn có trong danh sách quyền của đầu đọc; không còn ai giữ mới xoá
+    if uid is None: return
+    holder = _users_by_uid.get(uid) or next((u for u in _users_by_id.values() if u.get('uid') == uid), None)
+    if holder:
+        _users_by_uid[uid] = holder
+        access.set_user(holder)
+    else:
+        access.remove(uid)
+
+@writer.serialized
 def delete_user(doc_id):
-    users_table.remove(doc_ids=[doc_id])
+    store.remove_user(doc_id)
+    user = _users_by_id.get(doc_id)
+    if user:
+        _unindex_user(user)
+        _release_uid(user.get('uid'))
     state.trigger_update()
+    if user: _publish(user.get('username'), 'deleted')
 
 def create_user(data):
-    if 'password' in data:
-        data['password'] = get_password_hash(data['password'])
+    _take_password(data, keep_empty=True)
+    _create_user(data)
+
+@writer.serialized
+def _create_user(data):
     data['status'] = 'checkout'
     data['ignore_limit'] = data.get('ignore_limit', False)
-    users_table.insert(data)
+    doc_id = store.insert_user(data)
+    _index_user(Document(data, doc_id=doc_id))
+    access.set_user(data)
     state.trigger_update()
+    _publish(data.get('username'), 'created')
+
+@writer.serialized
+def reset_data():
+    # Xoá toàn bộ users + logs (dùng cho seed_data.py)
+    store.truncate()
+    _load_user_index()
+    access.reset(_users_by_id.values(), state.emergency_mode)
+    invalidate_aggregates()
+    _publish(None, 'system')
+
+@writer.serialized
+def add_log(username, action, timestamp=None, room=None):
+    t = timestamp or state.get_current_time()
+    store.append_logs([(username, action, t, room)])
+    _on_log_added(username, t, action)
+    _publish(username, 'logs', (t.year, t.month))
+
+def _log_slice(username, start=None, end=None):
+    # LogColumns (thời gian epoch µs + mã hành động) của user trong khoảng [start, end), tăng dần theo thời gian
+    return store.log_slice(username, start, end)
+
+def month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def get_logs_in_range(username, start=None, end=None):
+    # Logs (dict) của user trong khoảng [start, end), tăng dần theo thời gian
+    return _log_slice(username, start, end).to_dicts(username)
 
-def add_log(username, action):
-    logs_table.insert({
-        'username': username,
-        'action': action,
-        'timestamp': state.get_current_time().isoformat()
-    })
+def get_log_slices(start=None, end=None):
+    # {username: LogColumns} của mọi user trong khoảng [start, end), dùng cho tính lương hàng loạt
+    return store.log_slices(start, end)
 
 def get_logs_by_username(username):
-    Log = Query()
-    logs = logs_table.search(Log.username == username)
-    logs.sort(key=lambda x: x['timestamp'], reverse=True)
-    return logs
+    return get_logs_in_range(username)[::-1]
 
 def get_logs_by_month(username, year, month):
-    all_logs = get_logs_by_username(username)
-    return [l for l in all_logs if datetime.fromisoformat(l['timestamp']).year == year and datetime.fromisoformat(l['timestamp']).month == month]
+    return get_logs_in_range(username, *month_range(year, month))[::-1]
 
+@writer.serialized
 def reset_daily_limit(username):
     # Logic MỚI: Chỉ bật cờ cho phép vào lại, KHÔNG XOÁ log cũ
-    User = Query()
-    user = users_table.get(User.username == username)
+    user = _users_by_username.get(username)
     if user:
-        users_table.update({'ignore_limit': True}, doc_ids=[user.doc_id])
+        store.update_user(user.doc_id, {'ignore_limit': True})
+        user['ignore_limit'] = True
         print(f"--- ĐÃ BẬT CỜ MỞ KHOÁ CHO {username} (Giữ nguyên log cũ) ---")
         state.trigger_update()
+        _publish(username, 'profile')
         return True
     return False
 
+def _last_attendance(user, key):
+    # Lần vào (last_in) / ra (last_out) gần nhất lưu trên user. User cũ chưa có trường này
+    # thì lấy từ logs 1 lần, giữ trong bộ nhớ và được lưu xuống cùng lần ghi kế tiếp
+    if key not in user:
+        action = 'in' if key == 'last_in' else 'out'
+        cols, code = _log_slice(user['username']), ACTION_CODES[action]
+        t = next((v for v, a in zip(reversed(cols.ts), reversed(cols.actions)) if a == code), None)
+        user[key] = from_us(t).isoformat() if t is not None else None
+    return datetime.fromisoformat(user[key]) if user[key] else None
+
+def _attendance_update(user, action, t):
+    # Các trường cần ghi lên user khi có lần vào/ra lúc t: last_in/last_out, số ca trong ngày
+    key = 'last_in' if action == 'in' else 'last_out'
+    prev = _last_attendance(user, key)
+    fields = {key: t.isoformat()} if prev is None or t > prev else {}
+    if action == 'in':
+        day = t.date().isoformat()
+        if user.get('shift_date') == day: fields.update(shifts_today=user.get('shifts_today', 0) + 1)
+        elif (user.get('shift_date') or '') < day: fields.update(shift_date=day, shifts_today=1)
+    return fields
+
+@writer.serialized
 def force_checkout_all():
     # Checkout tất cả user đang checkin
     print("--- TỰ ĐỘNG CHECKOUT 5:00 SÁNG ---")
-    users = users_table.search(where('status') == 'checkin')
-    for u in users:
-        update_user_status(u['uid'], 'checkout')
-        add_log(u['username'], 'out')
-    state.trigger_update()
+    now = state.get_current_time()
+    _reload_shared_users()
+    with batch() as b:
+        for u in _users_by_id.values():
+            if u.get('status') != 'checkin': continue
+            b.update_user(u, dict(_attendance_update(u, 'out', now), status='checkout'))
+            b.add_log(u['username'], 'out', now)
+    return len(b.users)
 
-def calculate_salary(username, month, year):
+# Khung giờ khoá check-in: 20:00 đến 05:00 sáng (trừ admin)
+LOCKOUT_START_HOUR, LOCKOUT_END_HOUR = 20, 5
+
+# Danh sách quyền vào phòng có version cho đầu đọc (GET /access), cập nhật cùng các hàm ghi users ở trên
+access = AccessList((LOCKOUT_START_HOUR, LOCKOUT_END_HOUR))
+access.reset(_users_by_id.values(), state.emergency_mode)
+
+def transaction():
+    # Gom nhiều thao tác ghi thành 1 lần commit xuống storage
+    return writer.exclusive()
+
+class Batch:
+    # Thay đổi của 1 thao tác hàng loạt, chỉ áp dụng khi batch() kết thúc (đọc trong batch chưa thấy chúng)
+    def __init__(self):
+        self.users = {}    # doc_id -> (user, fields)
+        self.logs = []     # (username, action, thời gian, phòng)
+        self.system = {}
+
+    def update_user(self, user, fields):
+        self.users.setdefault(user.doc_id, (user, {}))[1].update(fields)
+
+    def add_log(self, username, action, t, room=None):
+        self.logs.append((username, action, t, room))
+
+    def set_system(self, fields):
+        self.system.update(fields)
+
+    def apply(self):
+        # 1 lần ghi users, 1 lần ghi logs, 1 lần cập nhật system
+        store.update_users({doc_id: fields for doc_id, (_, fields) in self.users.items()})
+        if self.logs: store.append_logs(self.logs)
+        state.trigger_update(self.system)
+        for user, fields in self.users.values(): _reindex_user(user, fields)
+        for username, action, t, _ in self.logs: _on_log_added(username, t, action)
+
+@contextmanager
+def batch():
+    # Gom nhiều thay đổi users/logs/system thành 1 lần commit + 1 sự kiện cho các dashboard.
+    # Lỗi giữa chừng thì bỏ cả batch, không ghi gì
+    b = Batch()
+    with transaction():
+        yield b
+        b.apply()
+    if b.users or b.logs or b.system: _publish(None, 'system')
+
+REPLAY_DAYS = 2
+
+def _replay_unflushed():
+    # db.json ghi trễ (write-behind) còn logs ghi ngay lúc commit: crash trong lúc chờ ghi thì lần vào/ra mới nhất
+    # đã có trong logs nhưng chưa lên user => áp dụng lại các log mới hơn last_in/last_out của user khi khởi động
+    if store.shared: return   # SQLite ghi users cùng transaction với logs
+    since = state.get_current_time() - timedelta(days=REPLAY_DAYS)
+    updates = {}
+    for user in _users_by_id.values():
+        # User chưa có last_in/last_out (lần quẹt đầu tiên chưa kịp ghi): phát lại từ mốc since
+        marks = [datetime.fromisoformat(user[k]) for k in ('last_in', 'last_out') if user.get(k)]
+        for t, action in _log_slice(user['username'], max(marks + [since]) + ONE_US).items():
+            # Logs tăng dần và đều mới hơn mốc đã lưu => luôn là lần vào/ra mới nhất
+            fields = dict(_attendance_update(user, action, t), status='checkin' if action == 'in' else 'checkout')
+            fields['last_in' if action == 'in' else 'last_out'] = t.isoformat()
+            user.update(fields)
+            updates.setdefault(user.doc_id, {}).update(fields)
+    if updates:
+        with transaction(): store.update_users(updates)
+        print(f"Đã khôi phục trạng thái {len(updates)} user từ logs chưa kịp ghi vào db.json")
+
+_replay_unflushed()
+
+def _recently_toggled(user, t):
+    # Chống dội theo giờ của lần quẹt: đã có lần vào/ra trong DEBOUNCE_SECONDS trước t => thẻ để yên / quẹt lặp.
+    # SwipeCache chỉ nhớ trong 1 process và không thấy /check/batch (đầu đọc gửi bù các lần đọc của thẻ để yên)
+    window = timedelta(seconds=DEBOUNCE_SECONDS)
+    marks = [datetime.fromisoformat(user[k]) for k in ('last_in', 'last_out') if user.get(k)]
+    if not marks: return False
+    if max(marks) <= t: return t - max(marks) < window
+    # Lần quẹt gửi bù cũ hơn lần vào/ra mới nhất: tra logs ngay trước thời điểm đó
+    return len(_log_slice(user['username'], t - window, t + ONE_US)) > 0
+
+def _checked_out_on(user, t):
+    # Đã có lần ra trong ngày của t. Thường chỉ cần last_out; lần quẹt gửi bù của ngày cũ (last_out đã sang
+    # ngày sau) thì tra logs của đúng ngày đó
+    day_start = t.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+    last_out = _last_attendance(user, 'last_out')
+    if not last_out or last_out < day_start: return False
+    if last_out < day_end: return True
+    return ACTION_CODES['out'] in _log_slice(user['username'], day_start, day_end).actions
+
+@writer.serialized
+def process_swipe(uid, room, now=None):
+    # Quy tắc quẹt thẻ dùng chung cho /check và /check/batch, trả về (status, lý do)
+    if store.shared:
+        # Nhiều process cùng ghi: đọc lại trong transaction (BEGIN IMMEDIATE khoá ghi giữa các process)
+        state.reload()
+        user = _reload_user(uid=uid)
+    else:
+        user = get_user_by_uid(uid)
+    if not user: return 0, 'unknown_uid'
+    uname = user['username']
+    allowed = user.get('allowed_rooms', [])
+    if 'all' not in allowed and room not in allowed: return 0, 'wrong_room'
+    current_status = user.get('status', 'checkout')
+    new_status = 'checkin' if current_status == 'checkout' else 'checkout'
+    current_time = now or state.get_current_time()
+    if _recently_toggled(user, current_time): return 1, 'debounced'
+
+    if new_status == 'checkin':
+        # 1. Cờ hiệu mở khoá (Ưu tiên cao nhất)
+        if user.get('ignore_limit'):
+            print(f"Chấp nhận check-in cho {uname} do Admin đã mở khoá")
+            update_user_details(user.doc_id, {'ignore_limit': False})
+        else:
+            # 2. Khung giờ khoá
+            if (current_time.hour >= LOCKOUT_START_HOUR or current_time.hour < LOCKOUT_END_HOUR) and user['role'] != 'admin':
+                return 0, 'lockout'
+
+            # 3. Quy tắc 1 lần duy nhất trong ngày: đã có lần ra trong ngày của lần quẹt (giờ hệ thống)
+            if _checked_out_on(user, current_time):
+                return 0, 'once_per_day'
+
+    action = 'in' if new_status == 'checkin' else 'out'
+    update_user_status(uid, new_status, _attendance_update(user, action, current_time))
+    add_log(uname, action, current_time, room)
+    return 1, 'accept'
+
+@writer.serialized
+def process_swipe_batch(events):
+    # Áp dụng nhiều lần quẹt (đầu đọc gửi bù sau khi mất mạng) theo thứ tự thời gian,
+    # commit 1 lần. Mỗi lần quẹt có kết quả riêng: sự kiện sai định dạng là 'invalid', lỗi khi xử lý là 'error',
+    # các sự kiện còn lại vẫn được ghi
+    results = [None] * len(events)
+    parsed = []
+    for i, e in enumerate(events):
+        try:
+            uid, room = e['uid'], e.get('room')
+            if not isinstance(uid, str) or not uid or not (room is None or isinstance(room, str)): raise ValueError(uid)
+            parsed.append((_event_time(e.get('ts')), i, uid, room))
+        except Exception:
+            results[i] = {'status': 0, 'reason': 'invalid'}
+    parsed.sort(key=lambda x: (x[0], x[1]))
+    with transaction():
+        for t, i, uid, room in parsed:
+            try: status, reason = process_swipe(uid, room, t)
+            except Exception as e:
+                print(f"Lỗi xử lý quẹt {uid}: {e}")
+                status, reason = 0, 'error'
+            results[i] = {'status': status, 'reason': reason}
+    return results
+
+def _event_time(ts):
+    # ts là giờ của đầu đọc (epoch giây hoặc ISO, có thể kèm múi giờ) -> giờ hệ thống: giờ máy chủ không kèm
+    # múi giờ, cộng time offset. Không có ts thì lấy giờ hiện tại
+    if ts is None: return state.get_current_time()
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool): t = datetime.fromtimestamp(ts)
+    elif isinstance(ts, str): t = datetime.fromisoformat(ts)
+    else: raise TypeError(ts)
+    if t.tzinfo is not None: t = t.astimezone().replace(tzinfo=None)
+    return t + timedelta(seconds=state.time_offset_seconds)
+
+# --- Tổng hợp giờ làm / lương theo ngày và theo tháng ---
+# Tạo theo từng tháng khi được hỏi (chỉ đọc logs của tháng đó), sau đó cập nhật dần khi có log 'out' đóng ca.
+# Ca chỉ tính khi vào/ra cùng tháng nên mỗi tháng tự đủ, tháng cũ đã đóng băng không cần nạp.
+# Lương đã nhân theo lương/h lúc tạo; đổi lương/h hoặc đổi time offset thì tạo lại.
+# Hệ số lương theo payrules: ca được cắt theo từng đoạn hệ số, giờ / lương của ca qua nửa đêm chia cho từng ngày.
+_aggregates = {}  # username -> {'rate', 'months': {(năm, tháng): tổng hợp tháng}}
+_agg_lock = threading.RLock()
+
+def _add_shift(agg, t_in, t_out):
+    weighted = 0.0
+    for s, e, r in payrules.rules.segments(to_us(t_in), to_us(t_out)):
+        day = agg['days'].setdefault(from_us(s).date(), [0.0, 0.0])
+        day[0] += (e - s) / US_PER_HOUR; day[1] += (e - s) * r / US_PER_HOUR * agg['rate']
+        weighted += (e - s) * r
+    agg['pay'] += weighted / US_PER_HOUR * agg['rate']
+
+def _get_aggregates(username, hourly_rate, year, month):
+    with _agg_lock:
+        user_aggs = _aggregates.get(username)
+        if user_aggs is None or user_aggs['rate'] != hourly_rate:
+            user_aggs = _aggregates[username] = {'rate': hourly_rate, 'months': {}}
+        agg = user_aggs['months'].get((year, month))
+        if agg is None:
+            agg = {'rate': hourly_rate, 'days': {}, 'pay': 0.0, 'present': set(), 'last': None}
+            for t, action in _log_slice(username, *month_range(year, month)).items():
+                _track_log(agg, t, action)
+            user_aggs['months'][(year, month)] = agg
+        return agg
+
+def _track_log(agg, t, action):
+    # 'out' ghép với log ngay trước nó (trong tháng) nếu đó là 'in'
+    last = agg['last']
+    if action == 'out' and last and last[1] == 'in': _add_shift(agg, last[0], t)
+    agg['present'].add(t.date())
+    agg['last'] = (t, action)
+
+def _on_log_added(username, t, action):
+    with _agg_lock:
+        months = _aggregates.get(username, {}).get('months', {})
+        agg = months.get((t.year, t.month))
+        if agg is None: return
+        if agg['last'] and t < agg['last'][0]:
+            # Log chèn vào giữa lịch sử (gửi bù) -> tính lại tháng đó khi cần
+            del months[(t.year, t.month)]
+        else:
+            _track_log(agg, t, action)
+
+def invalidate_aggregates(username=None):
+    with _agg_lock:
+        if username is None: _aggregates.clear()
+        else: _aggregates.pop(username, None)
+
+def _hourly_rate(username):
     user = get_user_by_username(username)
-    if not user or user.get('salary') is None: return 0
+    if not user or user.get('salary') is None: return None
     try:
-        hourly_rate = float(user['salary'])
+        return float(user['salary'])
     except:
-        return 0
-        
-    logs = get_logs_by_month(username, year, month)
-    logs.sort(key=lambda x: x['timestamp']) 
-    
-    total_salary = 0
-    checkin_time = None
-    holidays = [(1, 1), (4, 30), (5, 1), (9, 2)]
-    
-    for log in logs:
-        t = datetime.fromisoformat(log['timestamp'])
-        if log['action'] == 'in':
-            checkin_time = t
-        elif log['action'] == 'out' and checkin_time:
-            duration = (t - checkin_time).total_seconds() / 3600
-            
-            # Tính lương: Tách phần làm việc thành các khoảng nếu cần chính xác hơn
-            # Nhưng ở đây dùng logic đơn giản theo yêu cầu:
-            # Cuối tuần x2, Lễ x3, Ca đêm x1.5
-            
-            multiplier = 1.0
-            if (t.month, t.day) in holidays: multiplier = 3.0
-            elif t.weekday() >= 5: multiplier = 2.0
-            elif t.hour >= 18 or t.hour < 6: # Coi như làm đêm nếu checkout lúc đêm
-                multiplier = 1.5
-                
-            total_salary += duration * hourly_rate * multiplier
-            checkin_time = None
-    return int(total_salary)
+        return None
+
+def calculate_salary(username, month, year):
+    hourly_rate = _hourly_rate(username)
+    if hourly_rate is None: return 0
+    return int(_get_aggregates(username, hourly_rate, year, month)['pay'])
+
+def _user_aggregates(username, year, month):
+    hourly_rate = _hourly_rate(username)
+    return hourly_rate, _get_aggregates(username, hourly_rate if hourly_rate is not None else 0.0, year, month)
+
+def get_month_summary(username, year, month):
+    # {ngày: {'hours', 'pay'}} cho các ngày có log trong tháng (dùng cho lịch), 1 lượt trên tổng hợp
+    hourly_rate, agg = _user_aggregates(username, year, month)
+    summary = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        d = date(year, month, day)
+        if d not in agg['present']: continue
+        hours, pay = agg['days'].get(d, (0.0, 0.0))
+        summary[day] = {'hours': round(hours, 1), 'pay': int(pay) if hourly_rate is not None else 0}
+    return summary
+
+def get_daily_hours(username, end_date, days=7):
+    # [(ngày, giờ làm)] của `days` ngày gần nhất tính đến end_date (biểu đồ tuần)
+    series = []
+    for i in range(days - 1, -1, -1):
+        d = end_date - timedelta(days=i)
+        agg = _user_aggregates(username, d.year, d.month)[1]
+        series.append((d, round(agg['days'].get(d, (0.0, 0.0))[0], 1)))
+    return series
 
 def calculate_daily_stats(username, target_date):
-    user = get_user_by_username(username)
-    if not user or user.get('salary') is None: return 0, 0
-    try:
-        hourly_rate = float(user['salary'])
-    except:
-        return 0, 0
-    Log = Query()
-    all_logs = logs_table.search(Log.username == username)
-    day_logs = [log for log in all_logs if datetime.fromisoformat(log['timestamp']).date() == target_date]
-    day_logs.sort(key=lambda x: x['timestamp'])
-    
-    total_hours, daily_salary, checkin_time = 0, 0, None
-    holidays = [(1, 1), (4, 30), (5, 1), (9, 2)]
-    
-    for log in day_logs:
-        t = datetime.fromisoformat(log['timestamp'])
-        if log['action'] == 'in': checkin_time = t
-        elif log['action'] == 'out' and checkin_time:
-            duration = (t - checkin_time).total_seconds() / 3600
-            total_hours += duration
-            multiplier = 1.0
-            if (t.month, t.day) in holidays: multiplier = 3.0
-            elif t.weekday() >= 5: multiplier = 2.0
-            elif t.hour >= 18 or t.hour < 6: multiplier = 1.5
-            
-            daily_salary += duration * hourly_rate * multiplier
-            checkin_time = None
-            
-    return round(total_hours, 1), int(daily_salary)
\ No newline at end of file
+    hourly_rate = _hourly_rate(username)
+    if hourly_rate is None: return 0, 0
+    hours, pay = _get_aggregates(username, hourly_rate, target_date.year, target_date.month)['days'].get(target_date, (0.0, 0.0))
+    return round(hours, 1), int(pay)
@@ -0,0 +1,62 @@
+import threading
+
+# Bus sự kiện thay đổi dữ liệu, theo username. Trang của user chỉ nghe username của mình,
+# admin nghe ALL. Các hàm ghi trong db.py publish; sự kiện được gom lại và giao trên event loop
+# của UI (các hàm ghi chạy ở luồng ghi của db).
+ALL = '*'
+
+
+class EventBus:
+    def __init__(self):
+        self.subscribers = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.scheduled = False
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def subscribe(self, key, callback):
+        # Trả về hàm huỷ đăng ký
+        with self.lock:
+            self.subscribers.setdefault(key, []).append(callback)
+        def unsubscribe():
+            with self.lock:
+                callbacks = self.subscribers.get(key, [])
+                if callback in callbacks: callbacks.remove(callback)
+                if not callbacks: self.subscribers.pop(key, None)
+        return unsubscribe
+
+    def counts(self):
+        # {key: số callback đang nghe}
+        with self.lock:
+            return {key: len(callbacks) for key, callbacks in self.subscribers.items()}
+
+    def publish(self, username, kind, month=None):
+        # username=None: thay đổi toàn hệ thống (time offset, khẩn cấp), gửi cho mọi trang
+        with self.lock:
+            if not self.subscribers: return
+            event = self.pending.setdefault(username, {'username': username, 'kinds': set(), 'months': set()})
+            event['kinds'].add(kind)
+            if month: event['months'].add(month)
+            if self.scheduled: return
+            self.scheduled = True
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.flush)
+        else:
+            self.flush()
+
+    def flush(self):
+        # Giao các sự kiện đã gom (mỗi user tối đa 1 sự kiện mỗi lượt)
+        with self.lock:
+            events, self.pending, self.scheduled = list(self.pending.values()), {}, False
+        for event in events:
+            key = event['username']
+            with self.lock:
+                targets = list(self.subscribers.get(ALL, []))
+                if key is None: targets = [cb for cbs in self.subscribers.values() for cb in cbs]
+                else: targets += self.subscribers.get(key, [])
+            for callback in targets:
+                try: callback(event)
+                except Exception as e: print(f"Lỗi xử lý sự kiện: {e}")
@@ -0,0 +1,123 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from nicegui import app
+import db
+from records import ACTIONS, ROOMS, from_us
+
+# Xuất logs chấm công theo luồng (NDJSON / CSV) cho hệ thống HR / tính lương: GET /api/logs
+# Duyệt từng tháng: mỗi lúc chỉ giữ logs của 1 tháng trong bộ nhớ, xuất bao nhiêu năm cũng vậy.
+# Thứ tự (thời gian, username, thứ tự trong cùng thời điểm); mỗi dòng kèm cursor, gọi lại với cursor của
+# dòng cuối để lấy trang tiếp. Quyền: admin đã đăng nhập, hoặc header Authorization: Bearer <TIMEKEEPER_EXPORT_TOKEN>
+EXPORT_TOKEN = os.environ.get('TIMEKEEPER_EXPORT_TOKEN')
+FIELDS = ('username', 'action', 'timestamp', 'room', 'cursor')
+DEFAULT_LIMIT = 10000
+MAX_LIMIT = int(os.environ.get('TIMEKEEPER_EXPORT_MAX_LIMIT', 100000))   # Tối đa số dòng mỗi trang
+CHUNK_ROWS = 500   # Số dòng gom lại mỗi lần gửi
+
+router = APIRouter()
+
+
+def encode_cursor(t, username, k):
+    return base64.urlsafe_b64encode(f'{t}:{k}:{username}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    # (epoch µs, username, thứ tự) của dòng cuối đã nhận; ValueError nếu không hợp lệ
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        t, k, username = raw.split(':', 2)
+        return int(t), username, int(k)
+    except Exception:
+        raise ValueError('cursor không hợp lệ')
+
+
+def _months(first, last):
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def iter_logs(username=None, room=None, start=None, end=None, cursor=None, limit=None):
+    # Dict từng log theo thứ tự xuất, tối đa limit dòng
+    after = decode_cursor(cursor) if cursor else None
+    if after: start = max(start, from_us(after[0])) if start else from_us(after[0])
+    bounds = db.store.log_bounds()
+    if not bounds: return
+    first, last = max(start or bounds[0], bounds[0]), min(end or bounds[1], bounds[1])
+    emitted = 0
+    for year, month in _months(first, last):
+        lo, hi = db.month_range(year, month)
+        lo, hi = max(lo, start) if start else lo, min(hi, end) if end else hi
+        slices = {username: db.store.log_slice(username, lo, hi)} if username else db.get_log_slices(lo, hi)
+        rows = []
+        for u, cols in slices.items():
+            prev, k = None, 0
+            for t, a, r in zip(cols.ts, cols.actions, cols.rooms):
+                k = k + 1 if t == prev else 0
+                prev = t
+                if room and ROOMS[r] != room: continue   # Mã phòng chỉ được cấp khi đọc logs => so theo tên
+                if after and (t, u, k) <= after: continue
+                rows.append((t, u, k, a, r))
+        rows.sort()
+        for t, u, k, a, r in rows:
+            yield {'username': u, 'action': ACTIONS[a], 'timestamp': from_us(t).isoformat(), 'room': ROOMS[r], 'cursor': encode_cursor(t, u, k)}
+            emitted += 1
+            if limit and emitted >= limit: return
+
+
+def ndjson(logs):
+    lines = []
+    for log in logs:
+        lines.append(json.dumps(log, ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS: yield '\n'.join(lines) + '\n'; lines = []
+    if lines: yield '\n'.join(lines) + '\n'
+
+
+def csv_rows(logs):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS)
+    writer.writeheader()
+    n = 0
+    for log in logs:
+        writer.writerow(log)
+        n += 1
+        if n % CHUNK_ROWS == 0: yield buf.getvalue(); buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def _authorized(request):
+    if EXPORT_TOKEN and request.headers.get('Authorization') == f'Bearer {EXPORT_TOKEN}': return True
+    try: return app.storage.user.get('role') == 'admin'
+    except Exception: return False
+
+
+def _parse_time(value):
+    # Logs lưu giờ máy chủ không kèm múi giờ: giờ có múi giờ được đổi về giờ máy chủ
+    t = datetime.fromisoformat(value) if value else None
+    return t.astimezone().replace(tzinfo=None) if t and t.tzinfo else t
+
+
+@router.get('/api/logs')
+def api_logs(request: Request, user: str = None, room: str = None, start: str = None, end: str = None,
+             cursor: str = None, limit: int = DEFAULT_LIMIT, format: str = 'ndjson'):
+    # start/end: ISO (ngày hoặc ngày giờ), khoảng [start, end). limit: 1..MAX_LIMIT dòng mỗi trang
+    if not _authorized(request): return JSONResponse({'error': 'unauthorized'}, status_code=401)
+    if format not in ('ndjson', 'csv'): return JSONResponse({'error': 'format phải là ndjson hoặc csv'}, status_code=400)
+    if not 1 <= limit <= MAX_LIMIT: return JSONResponse({'error': f'limit phải từ 1 đến {MAX_LIMIT}'}, status_code=400)
+    try:
+        start, end = _parse_time(start), _parse_time(end)
+        if cursor: decode_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    logs = iter_logs(user, room, start, end, cursor, limit)
+    if format == 'csv':
+        return StreamingResponse(csv_rows(logs), media_type='text/csv; charset=utf-8',
+                                 headers={'Content-Disposition': 'attachment; filename="logs.csv"'})
+    return StreamingResponse(ndjson(logs), media_type='application/x-ndjson')
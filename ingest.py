@@ -0,0 +1,33 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+
+# Dịch vụ nhận quẹt thẻ chạy riêng, không có UI: cùng quy tắc trong db.py, chạy được nhiều worker.
+#   TIMEKEEPER_STORAGE=sqlite python ingest.py        (TIMEKEEPER_INGEST_PORT, TIMEKEEPER_INGEST_WORKERS)
+# Dashboard (main.py) chạy song song trên cùng file SQLite và nhận thay đổi qua notify.py.
+# db.json (TinyDB) chỉ an toàn trong 1 process nên không dùng được ở đây.
+# Kiểm tra trước khi import db: mở db.json ở đây có thể ghi đè lên dữ liệu của main.py
+if os.environ.get('TIMEKEEPER_STORAGE', 'json') != 'sqlite':
+    raise SystemExit('ingest.py cần storage dùng chung nhiều process: đặt TIMEKEEPER_STORAGE=sqlite cho cả ingest.py và main.py')
+
+import db
+import notify
+import swipe_api
+
+sender = notify.Sender()
+
+@asynccontextmanager
+async def lifespan(app):
+    db.bus.bind(asyncio.get_running_loop())
+    off = db.bus.subscribe(db.ALL, sender.send)
+    yield
+    off()
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(swipe_api.router)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('ingest:app', host=os.environ.get('TIMEKEEPER_INGEST_HOST', '0.0.0.0'), port=int(os.environ.get('TIMEKEEPER_INGEST_PORT', 8082)),
+                workers=int(os.environ.get('TIMEKEEPER_INGEST_WORKERS', os.cpu_count() or 1)))
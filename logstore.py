@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+
+# Lưu logs chấm công dạng append-only (JSON Lines), chia thành nhiều segment.
+# Mỗi lần quẹt thẻ chỉ ghi thêm 1 dòng, không ghi lại toàn bộ db.json.
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024   # Đủ lớn thì đóng segment, mở segment mới
+FSYNC_INTERVAL = 0.5                  # Giây giữa 2 lần fsync nền
+FSYNC_BATCH = 64                      # Hoặc fsync ngay khi đủ số dòng chờ
+COMPACT_MIN_SEGMENTS = 4              # Số segment đã đóng để bắt đầu gộp
+
+
+class LogStore:
+    def __init__(self, directory='logs', segment_max_bytes=SEGMENT_MAX_BYTES, fsync_interval=FSYNC_INTERVAL, fsync_batch=FSYNC_BATCH, sort_key=None):
+        self.directory = directory
+        # Khoá sắp xếp theo thời gian khi gộp segment
+        self.sort_key = sort_key or (lambda r: r.get('timestamp', ''))
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.lock = threading.RLock()
+        self.file = None
+        self.active_no = 0
+        self.pending = 0
+        self.compacting = False
+        os.makedirs(directory, exist_ok=True)
+        self._stop = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self._syncer.start()
+
+    # --- Segment files ---
+    def _seg_path(self, no):
+        return os.path.join(self.directory, f'seg-{no:06d}.jsonl')
+
+    def _seg_numbers(self, suffix='.jsonl'):
+        nums = []
+        for name in os.listdir(self.directory):
+            if name.startswith('seg-') and name.endswith(suffix):
+                try: nums.append(int(name[4:-len(suffix)]))
+                except ValueError: pass
+        return sorted(nums)
+
+    def _recover(self):
+        # Hoàn tất lần gộp bị gián đoạn: seg-N.compact là bản gộp đầy đủ của mọi segment <= N
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'): os.remove(os.path.join(self.directory, name))
+        for no in self._seg_numbers('.compact'):
+            for old in self._seg_numbers():
+                if old < no: os.remove(self._seg_path(old))
+            os.replace(os.path.join(self.directory, f'seg-{no:06d}.compact'), self._seg_path(no))
+
+    @staticmethod
+    def _read_segment(path):
+        # Trả về (records, số byte hợp lệ). Dòng cuối bị ghi dở (crash) sẽ bị bỏ qua
+        records, valid = [], 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'): break
+                try: records.append(json.loads(line))
+                except ValueError: break
+                valid += len(line)
+        return records, valid
+
+    def load(self):
+        # Replay toàn bộ segments khi khởi động, mở segment cuối để ghi tiếp
+        with self.lock:
+            self._recover()
+            records = []
+            nums = self._seg_numbers()
+            for no in nums:
+                recs, valid = self._read_segment(self._seg_path(no))
+                records.extend(recs)
+                if no == nums[-1] and valid < os.path.getsize(self._seg_path(no)):
+                    with open(self._seg_path(no), 'r+b') as f: f.truncate(valid)
+            self._open(nums[-1] if nums else 1)
+        if len(nums) - 1 >= COMPACT_MIN_SEGMENTS: self.compact_async()
+        return records
+
+    def _open(self, no):
+        if self.file: self._close_file()
+        self.active_no = no
+        self.file = open(self._seg_path(no), 'a', encoding='utf-8')
+
+    def _close_file(self):
+        self.file.flush(); os.fsync(self.file.fileno()); self.file.close()
+        self.file, self.pending = None, 0
+
+    # --- Ghi ---
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        # Trả về số byte đã ghi
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+        with self.lock:
+            self.file.write(data)
+            self.file.flush()
+            self.pending += len(records)
+            if self.pending >= self.fsync_batch: self._fsync()
+            if self.file.tell() >= self.segment_max_bytes: self._roll()
+        return len(data.encode('utf-8'))
+
+    def _fsync(self):
+        if self.file and self.pending:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def sync(self):
+        with self.lock: self._fsync()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+
+    def _roll(self):
+        self._open(self.active_no + 1)
+        if len(self._seg_numbers()) - 1 >= COMPACT_MIN_SEGMENTS: self.compact_async()
+
+    # --- Gộp segment (chạy nền) ---
+    def compact_async(self):
+        with self.lock:
+            if self.compacting: return
+            self.compacting = True
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        # Gộp các segment đã đóng thành 1 file sắp xếp theo thời gian, bỏ dòng hỏng
+        try:
+            with self.lock:
+                sealed = [no for no in self._seg_numbers() if no < self.active_no]
+            if len(sealed) < 2: return
+            records = []
+            for no in sealed: records.extend(self._read_segment(self._seg_path(no))[0])
+            records.sort(key=self.sort_key)
+            last = sealed[-1]
+            tmp = os.path.join(self.directory, f'seg-{last:06d}.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for r in records: f.write(json.dumps(r, ensure_ascii=False) + '\n')
+                f.flush(); os.fsync(f.fileno())
+            done = os.path.join(self.directory, f'seg-{last:06d}.compact')
+            os.replace(tmp, done)
+            for no in sealed[:-1]: os.remove(self._seg_path(no))
+            os.replace(done, self._seg_path(last))
+        finally:
+            self.compacting = False
+
+    def rewrite(self, records):
+        # Thay toàn bộ segment bằng records (sau khi đóng băng tháng cũ sang archive).
+        # Dùng cùng cơ chế .compact nên crash giữa chừng vẫn khôi phục được
+        while True:
+            with self.lock:
+                if not self.compacting: self.compacting = True; break
+            time.sleep(0.05)
+        try:
+            with self.lock:
+                if self.file: self._close_file()
+                no = self.active_no
+                tmp = os.path.join(self.directory, f'seg-{no:06d}.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    for r in records: f.write(json.dumps(r, ensure_ascii=False) + '\n')
+                    f.flush(); os.fsync(f.fileno())
+                os.replace(tmp, os.path.join(self.directory, f'seg-{no:06d}.compact'))
+                self._recover()
+                self._open(no + 1)
+        finally:
+            self.compacting = False
+
+    def clear(self):
+        with self.lock:
+            if self.file: self._close_file()
+            for no in self._seg_numbers(): os.remove(self._seg_path(no))
+            self._open(1)
+
+    def size_bytes(self):
+        return sum(os.path.getsize(self._seg_path(no)) for no in self._seg_numbers())
+
+    def close(self):
+        self._stop.set()
+        with self.lock:
+            if self.file: self._close_file()
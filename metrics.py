@@ -0,0 +1,105 @@
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Số đo nội bộ, xuất ở /metrics theo định dạng text của Prometheus.
+# observe() chỉ tốn 1 bisect + cộng dưới lock, đủ nhẹ để gắn vào đường quẹt thẻ.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry = []
+
+
+def _labels(names, values):
+    if not names: return ''
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{n}="{esc(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self.series = {}  # nhãn -> [số lần theo bucket (+Inf ở cuối), tổng]
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None: s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - start, *labels)
+
+    def timed(self, *labels):
+        # Hàm async: đo cả phần await (vd. chờ luồng ghi), không chỉ lúc tạo coroutine
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try: return await fn(*args, **kwargs)
+                    finally: self.observe(time.perf_counter() - start, *labels)
+                return async_wrapper
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally: self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorate
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = [(k, list(v[0]), v[1]) for k, v in self.series.items()]
+        for labels, counts, total in series:
+            acc = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                acc += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + (bound,))} {acc}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {acc}')
+        return lines
+
+
+class Gauge:
+    # Giá trị lấy lúc scrape từ hàm fn: trả về số, hoặc {(nhãn,...): số}
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name, self.help, self.labelnames, self.fn = name, help, tuple(labels), fn
+        _registry.append(self)
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        if self.fn is None: return lines
+        try: value = self.fn()
+        except Exception: return lines
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, v in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {v}')
+        return lines
+
+
+def render():
+    return '\n'.join(line for m in _registry for line in m.render()) + '\n'
+
+
+CHECK_SECONDS = Histogram('timekeeper_check_seconds', 'Thời gian xử lý /check theo quyết định', ['decision'])
+STORE_FLUSH_SECONDS = Histogram('timekeeper_store_flush_seconds', 'Thời gian ghi xuống storage mỗi lần commit')
+STORE_FLUSH_BYTES = Histogram('timekeeper_store_flush_bytes', 'Số byte ghi xuống storage mỗi lần commit', buckets=BYTES_BUCKETS)
+TIMER_SECONDS = Histogram('timekeeper_timer_seconds', 'Thời gian mỗi lượt chạy của ui.timer / cập nhật dashboard', ['timer'])
+PASSWORD_HASH_SECONDS = Histogram('timekeeper_password_hash_seconds', 'Thời gian băm / kiểm tra mật khẩu pbkdf2', ['op'], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+ROWS = Gauge('timekeeper_rows', 'Số dòng theo bảng', ['table'])
+DASHBOARDS = Gauge('timekeeper_dashboards', 'Số dashboard đang kết nối', ['role'])
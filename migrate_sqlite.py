@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+import tempfile
+from storage import JsonStorage, SQLiteStorage
+
+# Chuyển dữ liệu từ db.json (+ thư mục logs/) sang SQLite, chạy 1 lần:
+#   python migrate_sqlite.py [db.json] [logs] [timekeeper.sqlite3]
+# Sau đó chạy server với TIMEKEEPER_STORAGE=sqlite
+# Nguồn được đọc qua 1 bản sao tạm: JsonStorage chuyển logs cũ / đóng băng tháng khi nạp, bản gốc không bị sửa
+src_json = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('TIMEKEEPER_DB', 'db.json')
+src_logs = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('TIMEKEEPER_LOG_DIR', 'logs')
+dst = sys.argv[3] if len(sys.argv) > 3 else os.environ.get('TIMEKEEPER_SQLITE', 'timekeeper.sqlite3')
+
+work, src = tempfile.mkdtemp(prefix='timekeeper-migrate-'), None
+try:
+    if os.path.exists(src_json): shutil.copy2(src_json, os.path.join(work, 'db.json'))
+    if os.path.isdir(src_logs): shutil.copytree(src_logs, os.path.join(work, 'logs'))
+    src = JsonStorage(os.path.join(work, 'db.json'), os.path.join(work, 'logs'))
+    target = SQLiteStorage(dst)
+    if target.all_users():
+        print(f"{dst} đã có dữ liệu, bỏ qua.")
+        sys.exit(1)
+
+    with target.transaction():
+        users = src.all_users()
+        for doc_id, data in users:
+            target.insert_user(data, doc_id=doc_id)
+        system = src.get_system()
+        if system: target.set_system(system)
+        batch, total = [], 0
+        for log in src.iter_logs():
+            batch.append(log)
+            if len(batch) >= 5000:
+                target.append_logs(batch); total += len(batch); batch = []
+        target.append_logs(batch); total += len(batch)
+
+    target.conn.execute('ANALYZE')
+    target.close()
+    print(f"HOÀN TẤT! {len(users)} users, {total} logs -> {dst}")
+finally:
+    if src: src.close()
+    shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import os
+import socket
+
+# Kênh báo thay đổi giữa các process trên cùng máy (ingest.py -> dashboard main.py): UDP localhost,
+# gửi rồi quên, không chặn luồng nhận quẹt thẻ. Mất gói chỉ làm dashboard cập nhật chậm
+# (trang được vẽ lại ở lần thay đổi sau hoặc khi kết nối lại), dữ liệu vẫn nằm trong storage dùng chung.
+HOST = os.environ.get('TIMEKEEPER_NOTIFY_HOST', '127.0.0.1')
+PORT = int(os.environ.get('TIMEKEEPER_NOTIFY_PORT', 8766))
+
+
+def encode(event):
+    return json.dumps({'username': event['username'], 'kinds': sorted(event['kinds']), 'months': sorted(event['months'])}).encode('utf-8')
+
+
+class Sender:
+    def __init__(self, host=HOST, port=PORT):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, event):
+        # Dùng làm callback của db.bus
+        try:
+            self.sock.sendto(encode(event), self.addr)
+            self.sent += 1
+        except OSError:
+            # Dashboard chưa chạy / buffer đầy
+            self.dropped += 1
+
+
+class _Receiver(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        try: event = json.loads(data)
+        except ValueError: return
+        if isinstance(event, dict): self.callback(event)
+
+
+async def listen(callback, host=HOST, port=PORT):
+    # Gọi callback(event) trên event loop cho mỗi sự kiện nhận được; trả về transport để đóng
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: _Receiver(callback), local_addr=(host, port))
+    return transport
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+import metrics
+
+# Băm / kiểm tra mật khẩu pbkdf2 (vài chục ms CPU mỗi lần) trong process pool riêng: đăng nhập hàng loạt
+# đầu ca không chặn event loop đang phục vụ /check, và luồng ghi của db không bao giờ phải chờ KDF.
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+WORKERS = int(os.environ.get('TIMEKEEPER_HASH_WORKERS', max(1, min(4, (os.cpu_count() or 2) - 1))))
+MAX_WAITING = int(os.environ.get('TIMEKEEPER_HASH_MAX_WAITING', 64))   # Quá số yêu cầu đang chờ thì từ chối ngay
+BACKOFF_FREE_ATTEMPTS = 3      # Số lần nhập sai liên tiếp chưa phải chờ
+BACKOFF_BASE, BACKOFF_MAX = 1.0, 300.0
+MAX_TRACKED_USERNAMES = 10000
+
+
+class Busy(Exception):
+    pass
+
+
+def _hash(password):
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+# Gọi đồng bộ (script, seed dữ liệu)
+@metrics.PASSWORD_HASH_SECONDS.timed('hash')
+def hash_password_sync(password):
+    return _hash(password)
+
+
+@metrics.PASSWORD_HASH_SECONDS.timed('verify')
+def verify_password_sync(plain_password, hashed_password):
+    return _verify(plain_password, hashed_password)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_waiting = 0
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context('fork'))
+            else:
+                # Không có fork (Windows): spawn sẽ chạy lại main.py trong worker => dùng thread (hashlib nhả GIL khi tính pbkdf2)
+                _pool = ThreadPoolExecutor(WORKERS, thread_name_prefix='password-hash')
+        return _pool
+
+
+async def _run(op, fn, *args):
+    # Tối đa WORKERS phép tính cùng lúc; quá MAX_WAITING yêu cầu đang chờ thì báo bận
+    global _slots, _waiting
+    if _slots is None: _slots = asyncio.Semaphore(WORKERS)
+    if _waiting >= MAX_WAITING: raise Busy()
+    _waiting += 1
+    start = time.perf_counter()
+    try:
+        async with _slots:
+            return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+    finally:
+        _waiting -= 1
+        metrics.PASSWORD_HASH_SECONDS.observe(time.perf_counter() - start, op)
+
+
+async def hash_password(password):
+    return await _run('hash', _hash, password)
+
+
+async def verify_password(plain_password, hashed_password):
+    return await _run('verify', _verify, plain_password, hashed_password)
+
+
+def shutdown():
+    with _pool_lock:
+        # Lúc tắt server pool đã rảnh: chờ các worker thoát hẳn, tránh lỗi "Bad file descriptor" khi thoát interpreter
+        if _pool: _pool.shutdown(wait=True, cancel_futures=True)
+
+
+class LoginThrottle:
+    # Sai mật khẩu liên tiếp quá free_attempts lần thì phải chờ 1s, 2s, 4s... (tối đa max_delay) theo từng username.
+    # Đang phải chờ thì từ chối luôn, không tốn 1 lần KDF
+    def __init__(self, free_attempts=BACKOFF_FREE_ATTEMPTS, base=BACKOFF_BASE, max_delay=BACKOFF_MAX):
+        self.free_attempts = free_attempts
+        self.base = base
+        self.max_delay = max_delay
+        self.failures = {}  # username -> (số lần sai, thời điểm được thử lại)
+
+    def retry_after(self, username):
+        item = self.failures.get(username)
+        return max(0.0, item[1] - time.monotonic()) if item else 0.0
+
+    def failed(self, username):
+        count = self.failures.pop(username, (0, 0))[0] + 1
+        extra = count - self.free_attempts
+        delay = min(self.max_delay, self.base * 2 ** (extra - 1)) if extra > 0 else 0.0
+        self.failures[username] = (count, time.monotonic() + delay)
+        while len(self.failures) > MAX_TRACKED_USERNAMES:
+            self.failures.pop(next(iter(self.failures)))
+        return delay
+
+    def succeeded(self, username):
+        self.failures.pop(username, None)
+
+
+throttle = LoginThrottle()
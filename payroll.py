@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import numpy as np
+import db
+import payrules
+from payrules import US_PER_HOUR
+from records import ACTION_CODES, from_us
+
+# Tính lương cả công ty cho 1 tháng bằng NumPy: nạp logs của tháng thành mảng
+# (thời gian epoch micro giây, chỉ số user, mã hành động) rồi ghép ca + nhân hệ số một lượt.
+# Dùng chung bảng hệ số với db (payrules), kết quả giống db.calculate_salary cho từng user.
+IN, OUT = ACTION_CODES['in'], ACTION_CODES['out']
+
+
+def load_month(year, month):
+    # Trả về (usernames, ts, user, action): logs sắp theo (user, thời gian).
+    # Logs trong bộ nhớ đã là mảng epoch µs + mã hành động nên chỉ cần ghép mảng, không parse
+    slices = db.get_log_slices(*db.month_range(year, month))
+    usernames = list(slices)
+    if not usernames:
+        return usernames, np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.int8)
+    ts = np.concatenate([np.frombuffer(c.ts, dtype=np.int64) for c in slices.values()])
+    action = np.concatenate([np.frombuffer(c.actions, dtype=np.int8) for c in slices.values()])
+    user = np.repeat(np.arange(len(usernames), dtype=np.int32), [len(c) for c in slices.values()])
+    return usernames, ts, user, action
+
+
+def weighted_clock(first_year, last_year):
+    # Hàm W(t) = số µs đã nhân hệ số tính từ đầu năm first_year, tuyến tính trong từng đoạn của bảng:
+    # giờ nhân hệ số của ca [t_in, t_out) = W(t_out) - W(t_in), dù ca cắt qua bao nhiêu đoạn.
+    # Các giá trị đều là bội của 0.5 µs nên phép cộng / trừ trên float64 là chính xác
+    bounds, rates = payrules.rules.timeline(first_year, last_year)
+    bounds, rates = np.frombuffer(bounds, dtype=np.int64), np.frombuffer(rates, dtype=np.float64)
+    cum = np.concatenate(([0.0], np.cumsum(np.diff(bounds) * rates)))
+
+    def clock(t):
+        i = np.searchsorted(bounds, t, side='right') - 1
+        return cum[i] + (t - bounds[i]) * rates[i]
+    return clock
+
+
+def weighted_hours(t_in, t_out):
+    if not len(t_in): return np.zeros(0)
+    clock = weighted_clock(from_us(int(t_in.min())).year, from_us(int(t_out.max())).year)
+    return (clock(t_out) - clock(t_in)) / US_PER_HOUR
+
+
+def run_payroll(year, month):
+    usernames, ts, user, action = load_month(year, month)
+    index = {name: i for i, name in enumerate(usernames)}
+    rates = np.zeros(len(usernames))
+    users = db.get_all_users()
+    for u in users:
+        if u.get('username') in index:
+            try: rates[index[u['username']]] = float(u['salary'])
+            except (TypeError, ValueError, KeyError): pass
+
+    # 'out' ghép với log ngay trước nó nếu đó là 'in' của cùng user
+    paired = (action[1:] == OUT) & (action[:-1] == IN) & (user[1:] == user[:-1])
+    t_out, t_in, who = ts[1:][paired], ts[:-1][paired], user[1:][paired]
+    duration = (t_out - t_in) / US_PER_HOUR
+    pay = weighted_hours(t_in, t_out) * rates[who]
+    hours_by_user = np.bincount(who, weights=duration, minlength=len(usernames))
+    pay_by_user = np.bincount(who, weights=pay, minlength=len(usernames))
+
+    result = []
+    for u in users:
+        i = index.get(u.get('username'))
+        result.append({
+            'username': u.get('username'),
+            'name': u.get('name', ''),
+            'salary_per_hour': u.get('salary'),
+            'hours': round(float(hours_by_user[i]), 2) if i is not None else 0.0,
+            'salary': int(pay_by_user[i]) if i is not None else 0,
+        })
+    return result
+
+
+def to_csv(rows):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=['username', 'name', 'salary_per_hour', 'hours', 'salary'])
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue().encode('utf-8-sig')
+
+
+def to_json(rows):
+    return json.dumps(rows, ensure_ascii=False, indent=2).encode('utf-8')
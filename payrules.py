@@ -0,0 +1,116 @@
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from records import to_us, from_us
+
+# Hệ số lương: Lễ x3 cả ngày, Cuối tuần (T7, CN) x2 cả ngày, ngày thường trong khung đêm x1.5, còn lại x1.
+# Mỗi năm được dựng 1 lần thành bảng ranh giới (epoch µs, luôn có ranh giới lúc nửa đêm) -> hệ số của đoạn
+# bắt đầu tại đó. Ca làm được cắt theo bảng nên ca vắt qua 18h, qua nửa đêm, sang cuối tuần / ngày lễ
+# được tính đúng từng đoạn, chi phí theo số đoạn chứ không theo từng giờ.
+# TIMEKEEPER_HOLIDAYS: "MM-DD" (hằng năm) hoặc "YYYY-MM-DD" (1 lần, vd. Tết âm lịch), cách nhau dấu phẩy
+# TIMEKEEPER_NIGHT_HOURS: "<giờ bắt đầu>-<giờ kết thúc>", qua nửa đêm nếu bắt đầu > kết thúc
+HOLIDAY_RATE, WEEKEND_RATE, NIGHT_RATE, NORMAL_RATE = 3.0, 2.0, 1.5, 1.0
+HOLIDAYS = os.environ.get('TIMEKEEPER_HOLIDAYS', '01-01,04-30,05-01,09-02')
+NIGHT_HOURS = os.environ.get('TIMEKEEPER_NIGHT_HOURS', '18-6')
+US_PER_HOUR = 3600 * 10**6
+
+
+def parse_holidays(text):
+    # -> (set (tháng, ngày) lặp hằng năm, set date); ValueError nếu sai định dạng
+    yearly, dates = set(), set()
+    for item in filter(None, (s.strip() for s in text.split(','))):
+        parts = [int(p) for p in item.split('-')]
+        if len(parts) == 2:
+            date(2000, *parts)   # Kiểm tra ngày hợp lệ (năm nhuận để nhận 02-29)
+            yearly.add(tuple(parts))
+        elif len(parts) == 3: dates.add(date(*parts))
+        else: raise ValueError(f'ngày lễ không hợp lệ: {item}')
+    return yearly, dates
+
+
+def parse_night(text):
+    start, end = (int(p) for p in text.split('-'))
+    if not (0 <= start <= 24 and 0 <= end <= 24): raise ValueError(f'khung giờ đêm không hợp lệ: {text}')
+    return start % 24, end
+
+
+class PayRules:
+    def __init__(self, holidays=HOLIDAYS, night_hours=NIGHT_HOURS):
+        self.yearly, self.dates = parse_holidays(holidays)
+        self.night = parse_night(night_hours)
+        self.weekday = self._weekday_segments()
+        self.tables = {}   # năm -> (ranh giới, hệ số); ranh giới có thêm phần tử cuối là đầu năm sau
+        self.recent = (array('q', [0, 0]), array('d'))   # Bảng vừa dùng (hầu hết các ca cùng 1 năm)
+        self.lock = threading.Lock()
+
+    def _is_night(self, hour):
+        start, end = self.night
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def _weekday_segments(self):
+        # [(giờ bắt đầu, hệ số)] của 1 ngày thường, gộp các đoạn liền nhau cùng hệ số
+        segments = []
+        for hour in sorted({0, *self.night} - {24}):
+            rate = NIGHT_RATE if self._is_night(hour) else NORMAL_RATE
+            if not segments or segments[-1][1] != rate: segments.append((hour, rate))
+        return segments
+
+    def day_rate(self, d):
+        # Hệ số cả ngày (Lễ / Cuối tuần), None nếu là ngày thường
+        if (d.month, d.day) in self.yearly or d in self.dates: return HOLIDAY_RATE
+        if d.weekday() >= 5: return WEEKEND_RATE
+        return None
+
+    def table(self, year):
+        result = self.tables.get(year)
+        if result is None:
+            with self.lock:
+                result = self.tables.get(year)
+                if result is None: result = self.tables[year] = self._compile(year)
+        return result
+
+    def _compile(self, year):
+        bounds, rates = array('q'), array('d')
+        d, one_day = date(year, 1, 1), timedelta(days=1)
+        while d.year == year:
+            midnight = to_us(datetime(d.year, d.month, d.day))
+            rate = self.day_rate(d)
+            for hour, r in ([(0, rate)] if rate is not None else self.weekday):
+                bounds.append(midnight + hour * US_PER_HOUR); rates.append(r)
+            d += one_day
+        bounds.append(to_us(datetime(year + 1, 1, 1)))
+        return bounds, rates
+
+    def timeline(self, first_year, last_year):
+        # Bảng liền mạch cho nhiều năm (tính hàng loạt)
+        bounds, rates = array('q'), array('d')
+        for year in range(first_year, last_year + 1):
+            b, r = self.table(year)
+            bounds.extend(b[:-1]); rates.extend(r)
+        bounds.append(to_us(datetime(last_year + 1, 1, 1)))
+        return bounds, rates
+
+    def segments(self, t_in, t_out):
+        # Cắt ca [t_in, t_out) (epoch µs) theo bảng: [(bắt đầu, kết thúc, hệ số)]
+        result = []
+        while t_in < t_out:
+            bounds, rates = self.recent
+            if not bounds[0] <= t_in < bounds[-1]:
+                bounds, rates = self.recent = self.table(from_us(t_in).year)
+            for i in range(bisect_right(bounds, t_in) - 1, len(rates)):
+                end = bounds[i + 1]
+                if end >= t_out:
+                    result.append((t_in, t_out, rates[i]))
+                    return result
+                result.append((t_in, end, rates[i]))
+                t_in = end
+        return result
+
+    def weighted_hours(self, t_in, t_out):
+        # Số giờ đã nhân hệ số của ca
+        return sum((e - s) * r for s, e, r in self.segments(t_in, t_out)) / US_PER_HOUR
+
+
+rules = PayRules()
@@ -0,0 +1,104 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+# Dạng lưu logs trong bộ nhớ: mỗi user 1 cặp mảng (thời gian epoch micro giây int64, mã hành động int8)
+# thay cho 1 dict {username, action, timestamp ISO} mỗi log. Chỉ đổi sang dict ở biên (API, UI).
+EPOCH, ONE_US = datetime(1970, 1, 1), timedelta(microseconds=1)
+ACTIONS = ('in', 'out')
+ACTION_CODES = {a: i for i, a in enumerate(ACTIONS)}
+# Phòng quẹt thẻ giữ theo mã uint16 (bảng mã dùng chung cả process, file chỉ lưu tên phòng).
+# Mã 0 = không rõ phòng (logs ghi trước khi lưu phòng, log thêm tay)
+ROOMS = [None]
+ROOM_CODES = {None: 0}
+_rooms_lock = threading.Lock()
+
+
+def to_us(t):
+    return (t - EPOCH) // ONE_US
+
+
+def from_us(v):
+    return EPOCH + timedelta(microseconds=v)
+
+
+def room_code(room):
+    code = ROOM_CODES.get(room)
+    if code is None:
+        with _rooms_lock:
+            code = ROOM_CODES.get(room)
+            if code is None:
+                code = ROOM_CODES[room] = len(ROOMS)
+                ROOMS.append(room)
+    return code
+
+
+def _zeros(n):
+    return array('H', bytes(2 * n))
+
+
+class LogColumns:
+    # Logs của 1 user, tăng dần theo thời gian
+    __slots__ = ('ts', 'actions', 'rooms')
+
+    def __init__(self, ts=None, actions=None, rooms=None):
+        self.ts = ts if ts is not None else array('q')
+        self.actions = actions if actions is not None else array('b')
+        self.rooms = rooms if rooms is not None else _zeros(len(self.ts))
+
+    def __len__(self):
+        return len(self.ts)
+
+    def add(self, t, code, room=0):
+        # t: epoch micro giây, room: mã phòng. Log gửi bù (cũ hơn log cuối) được chèn đúng chỗ
+        if not self.ts or t >= self.ts[-1]:
+            self.ts.append(t); self.actions.append(code); self.rooms.append(room)
+        else:
+            i = bisect_right(self.ts, t)
+            self.ts.insert(i, t); self.actions.insert(i, code); self.rooms.insert(i, room)
+
+    def extend(self, other):
+        self.ts.extend(other.ts); self.actions.extend(other.actions); self.rooms.extend(other.rooms)
+
+    def bounds(self, start=None, end=None):
+        lo = bisect_left(self.ts, to_us(start)) if start else 0
+        hi = bisect_left(self.ts, to_us(end), lo) if end else len(self.ts)
+        return lo, hi
+
+    def slice(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return LogColumns(self.ts[lo:hi], self.actions[lo:hi], self.rooms[lo:hi])
+
+    def split(self, i):
+        return LogColumns(self.ts[:i], self.actions[:i], self.rooms[:i]), LogColumns(self.ts[i:], self.actions[i:], self.rooms[i:])
+
+    def merge(self, other):
+        # Gộp 2 dãy đã sắp xếp (dãy này đứng trước khi trùng thời gian)
+        if not other: return self
+        if not self or self.ts[-1] <= other.ts[0]: return LogColumns(self.ts + other.ts, self.actions + other.actions, self.rooms + other.rooms)
+        items = sorted(zip(self.ts + other.ts, self.actions + other.actions, self.rooms + other.rooms), key=lambda x: x[0])
+        return LogColumns(array('q', (t for t, _, _ in items)), array('b', (a for _, a, _ in items)), array('H', (r for _, _, r in items)))
+
+    def contains(self, t, code):
+        i = bisect_left(self.ts, t)
+        while i < len(self.ts) and self.ts[i] == t:
+            if self.actions[i] == code: return True
+            i += 1
+        return False
+
+    def items(self):
+        # (thời gian, hành động) cho các phép tính trong db.py
+        return ((from_us(t), ACTIONS[a]) for t, a in zip(self.ts, self.actions))
+
+    def rows(self):
+        # (thời gian epoch µs, hành động, tên phòng hoặc None)
+        return zip(self.ts, (ACTIONS[a] for a in self.actions), (ROOMS[r] for r in self.rooms))
+
+    def to_dicts(self, username):
+        logs = []
+        for t, a, room in self.rows():
+            log = {'username': username, 'action': a, 'timestamp': from_us(t).isoformat()}
+            if room is not None: log['room'] = room
+            logs.append(log)
+        return logs
@@ -8,8 +8,7 @@ db.init_db()
 
 # 2. Làm sạch dữ liệu cũ
 print("Đang làm sạch Database...")
-db.users_table.truncate()
-db.logs_table.truncate()
+db.reset_data()
 
 # 3. Danh sách 5 người dùng với UID CHÍNH XÁC
 users = [
@@ -91,8 +90,8 @@ for u in users:
         check_in = current_day.replace(hour=8, minute=random.randint(0,30), second=0)
         check_out = current_day.replace(hour=17, minute=random.randint(30,59), second=0)
         
-        db.logs_table.insert({'username': u['username'], 'action': 'in', 'timestamp': check_in.isoformat()})
-        db.logs_table.insert({'username': u['username'], 'action': 'out', 'timestamp': check_out.isoformat()})
+        db.add_log(u['username'], 'in', check_in)
+        db.add_log(u['username'], 'out', check_out)
         
         current_day += timedelta(days=1)
 
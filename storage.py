@@ -0,0 +1,599 @@
+from tinydb import TinyDB, where
+from tinydb.table import Document
+from tinydb.storages import JSONStorage
+from tinydb.middlewares import CachingMiddleware
+from datetime import datetime, timedelta
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from logstore import LogStore
+from archive import MonthArchive
+from records import ACTION_CODES, ROOMS, LogColumns, room_code, to_us, from_us
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Lớp lưu trữ dùng chung cho db.py. Có 2 backend:
+#  - JsonStorage: db.json (users, system) + log segments append-only (mặc định)
+#  - SQLiteStorage: 1 file SQLite ở chế độ WAL, logs được đánh chỉ mục (username, timestamp)
+# Chọn bằng biến môi trường TIMEKEEPER_STORAGE=json|sqlite
+# on_flush(giây, số byte): hook gọi sau mỗi lần commit xuống đĩa (db.py gắn vào metrics)
+# shared: nhiều process được cùng mở storage (chỉ SQLite) => db.py phải đọc lại user/system trước khi quyết định
+#
+# JsonStorage chia logs theo tháng: tháng đã chốt lương (hết tháng + FREEZE_GRACE_DAYS ngày) được đóng băng
+# thành archive bất biến (logs/archive/YYYY-MM.bin, xem archive.py) và chỉ nạp khi có ai hỏi tới tháng đó.
+# Bộ nhớ + thời gian khởi động chỉ còn phụ thuộc vào các tháng đang mở.
+FREEZE_GRACE_DAYS = int(os.environ.get('TIMEKEEPER_FREEZE_GRACE_DAYS', 10))
+ARCHIVE_CACHE_MONTHS = 12   # Số tháng archive giữ trong bộ nhớ sau khi được đọc
+# users/system (db.json) ghi trễ (write-behind): ghi sau FLUSH_INTERVAL giây kể từ thay đổi đầu tiên chưa ghi,
+# hoặc ngay khi đủ FLUSH_DIRTY thay đổi. FLUSH_INTERVAL=0: ghi sau mỗi commit như trước. Logs luôn ghi ngay lúc commit
+FLUSH_INTERVAL = float(os.environ.get('TIMEKEEPER_FLUSH_INTERVAL', 1.0))
+FLUSH_DIRTY = int(os.environ.get('TIMEKEEPER_FLUSH_DIRTY', 500))
+
+
+def _record_time(r):
+    # Khoá sắp xếp khi gộp segment: dòng mới [username, mã, epoch µs] hoặc dict cũ
+    return r[2] if isinstance(r, list) else to_us(datetime.fromisoformat(r['timestamp']))
+
+
+def _month_of(t):
+    return (t.year, t.month)
+
+
+def _month_start(month):
+    return datetime(month[0], month[1], 1)
+
+
+def _next_month(month):
+    return (month[0] + 1, 1) if month[1] == 12 else (month[0], month[1] + 1)
+
+
+class DeferredWrites(CachingMiddleware):
+    # Ghi vào db.json chỉ khi JsonStorage gọi flush, không phải sau mỗi thao tác
+    WRITE_CACHE_SIZE = 1 << 30
+
+    def __call__(self, path, *args, **kwargs):
+        self.path = path
+        return super().__call__(path, *args, **kwargs)
+
+    @property
+    def dirty(self):
+        return self._cache_modified_count > 0
+
+    @property
+    def dirty_count(self):
+        return self._cache_modified_count
+
+    def flush(self):
+        # Ghi file tạm rồi đổi tên: crash giữa lúc ghi không làm hỏng db.json
+        if not self.dirty: return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._cache_modified_count = 0
+
+
+class JsonStorage:
+    def __init__(self, path='db.json', log_dir='logs', flush_interval=FLUSH_INTERVAL, flush_dirty=FLUSH_DIRTY):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_dirty = flush_dirty
+        self.flush_timer = None
+        self.db = TinyDB(path, storage=DeferredWrites(JSONStorage))
+        self.users_table = self.db.table('users')
+        self.logs_table = self.db.table('logs')
+        self.system_table = self.db.table('system')
+        self.log_store = LogStore(log_dir, sort_key=_record_time)
+        self.archive_dir = os.path.join(log_dir, 'archive')
+        # write_lock: transaction + ghi đĩa; lock: chỉ bảo vệ chỉ mục logs trong bộ nhớ (đọc không phải chờ ghi đĩa)
+        self.write_lock = threading.RLock()
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.pending_logs = []
+        self.on_flush = None
+        self.shared = False
+        # Chỉ mục logs theo user: username -> (thời gian đã parse, log), tăng dần theo thời gian (chỉ các tháng đang mở)
+        self.logs_by_user = {}
+        # Tháng đã đóng băng -> số log; archive đã nạp giữ theo LRU
+        self.frozen = {}
+        self.archives = OrderedDict()
+        self.archive_lock = threading.Lock()
+        self.next_freeze = None
+        self._load_logs()
+
+    @contextmanager
+    def transaction(self):
+        with self.write_lock:
+            self.depth += 1
+            try:
+                yield self
+            finally:
+                self.depth -= 1
+                if self.depth == 0: self._commit()
+
+    def _commit(self):
+        start, written = time.perf_counter(), 0
+        if self.pending_logs:
+            written += self.log_store.append_many(self.pending_logs)
+            self.pending_logs = []
+        if self.db.storage.dirty:
+            if self.flush_interval <= 0 or self.db.storage.dirty_count >= self.flush_dirty:
+                written += self._flush_tables()
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        if self.on_flush and written: self.on_flush(time.perf_counter() - start, written)
+        if datetime.now() >= self.next_freeze:
+            try: self._freeze()
+            except Exception as e:
+                print(f"Lỗi đóng băng logs: {e}")
+                self.next_freeze = datetime.now() + timedelta(hours=1)
+
+    def _flush_tables(self):
+        # db.json được ghi lại toàn bộ
+        if self.flush_timer: self.flush_timer.cancel(); self.flush_timer = None
+        if not self.db.storage.dirty: return 0
+        self.db.storage.flush()
+        return os.path.getsize(self.path)
+
+    def flush(self):
+        # Ghi ngay users/system đang chờ (hẹn giờ write-behind, hoặc khi cần bền vững ngay)
+        with self.write_lock:
+            if self.depth: self.flush_timer = None; return   # Đang trong transaction: commit sẽ hẹn giờ lại
+            start = time.perf_counter()
+            written = self._flush_tables()
+            if self.on_flush and written: self.on_flush(time.perf_counter() - start, written)
+
+    # --- Users ---
+    def all_users(self):
+        with self.write_lock:
+            return [(u.doc_id, dict(u)) for u in self.users_table.all()]
+
+    def insert_user(self, data, doc_id=None):
+        with self.transaction():
+            return self.users_table.insert(Document(data, doc_id=doc_id) if doc_id else data)
+
+    def update_user(self, doc_id, fields):
+        with self.transaction():
+            self.users_table.update(fields, doc_ids=[doc_id])
+
+    def update_users(self, updates):
+        # updates: {doc_id: fields}. Mỗi lần update của TinyDB duyệt lại cả bảng => gom các user
+        # có cùng fields (thao tác hàng loạt thường chỉ có 1-2 nhóm) thành 1 lần update mỗi nhóm
+        groups = {}
+        for doc_id, fields in updates.items():
+            groups.setdefault(json.dumps(fields, sort_keys=True, default=str), (fields, []))[1].append(doc_id)
+        with self.transaction():
+            for fields, doc_ids in groups.values(): self.users_table.update(fields, doc_ids=doc_ids)
+
+    def update_all_users(self, fields):
+        with self.transaction():
+            self.users_table.update(fields)
+
+    def get_user(self, uid=None, username=None):
+        # (doc_id, data) hoặc None
+        with self.write_lock:
+            user = self.users_table.get(where('uid') == uid if uid is not None else where('username') == username)
+            return (user.doc_id, dict(user)) if user else None
+
+    def remove_user(self, doc_id):
+        with self.transaction():
+            self.users_table.remove(doc_ids=[doc_id])
+
+    # --- System ---
+    def get_system(self):
+        with self.write_lock:
+            state = self.system_table.get(doc_id=1)
+            return dict(state) if state else None
+
+    def set_system(self, fields):
+        with self.transaction():
+            if self.system_table.get(doc_id=1): self.system_table.update(fields, doc_ids=[1])
+            else: self.system_table.insert(fields)
+
+    # --- Logs ---
+    # Segment lưu mỗi log 1 dòng [username, mã hành động, epoch micro giây(, phòng)]; chỉ mục trong bộ nhớ là
+    # username -> LogColumns. Dòng dạng dict cũ ({username, action, timestamp}) được đổi khi nạp
+    def _load_logs(self):
+        self.logs_by_user.clear()
+        self._load_frozen()
+        records = self.log_store.load()
+        legacy = [dict(l) for l in self.logs_table.all()]
+        if legacy:
+            # Logs cũ trong db.json: chuyển sang log store (chỉ chạy 1 lần)
+            records.extend(legacy)
+        grouped, dropped, converted = {}, 0, 0
+        for r in records:
+            if isinstance(r, dict):
+                r = [r['username'], ACTION_CODES[r['action']], to_us(datetime.fromisoformat(r['timestamp'])), r.get('room')]
+                converted += 1
+            username, code, t = r[:3]
+            month = _month_of(from_us(t))
+            # Crash giữa lúc đóng băng: log đã nằm trong archive thì bỏ bản trong segment
+            if month in self.frozen and self._archive(month).contains(username, t, code):
+                dropped += 1; continue
+            grouped.setdefault(username, []).append((t, code, room_code(r[3]) if len(r) > 3 else 0))
+        for username, items in grouped.items():
+            items.sort(key=lambda x: x[0])
+            self.logs_by_user[username] = LogColumns(array('q', (t for t, _, _ in items)), array('b', (a for _, a, _ in items)), array('H', (r for _, _, r in items)))
+        if dropped or converted:
+            self.log_store.rewrite(self._hot_records())
+            if legacy:
+                self.logs_table.truncate()
+                self.db.storage.flush()
+        if converted: print(f"Đã chuyển {converted} log sang dạng gọn")
+        self._freeze()
+
+    def _hot_records(self):
+        return [[username, a, t, ROOMS[r]] if r else [username, a, t]
+                for username, cols in self.logs_by_user.items() for t, a, r in zip(cols.ts, cols.actions, cols.rooms)]
+
+    # --- Tháng đóng băng ---
+    def _load_frozen(self):
+        # Chỉ đọc header (số log) của từng archive, dữ liệu nạp khi cần
+        self.frozen.clear(); self.archives.clear()
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for name in os.listdir(self.archive_dir):
+            path = os.path.join(self.archive_dir, name)
+            if name.endswith('.tmp'): os.remove(path)
+            elif name.endswith('.bin'):
+                year, month = name[:-4].split('-')
+                self.frozen[(int(year), int(month))] = MonthArchive.read_count(path)
+
+    def _cache_archive(self, month, archive):
+        self.archives[month] = archive
+        self.archives.move_to_end(month)
+        while len(self.archives) > ARCHIVE_CACHE_MONTHS: self.archives.popitem(last=False)
+
+    def _archive(self, month):
+        with self.archive_lock:
+            archive = self.archives.get(month)
+            if archive is None: archive = MonthArchive.load(MonthArchive.path(self.archive_dir, month))
+            self._cache_archive(month, archive)
+            return archive
+
+    def _frozen_months(self, start=None, end=None):
+        # Các tháng đã đóng băng giao với [start, end)
+        return [m for m in sorted(self.frozen)
+                if (start is None or _month_start(_next_month(m)) > start) and (end is None or _month_start(m) < end)]
+
+    def _freeze(self):
+        # Chuyển logs của các tháng đã chốt lương sang archive rồi ghi lại segment với phần còn lại.
+        # Log ghi muộn vào tháng đã đóng băng (gửi bù, chỉnh giờ) nằm ở segment tới lần đóng băng sau
+        horizon = _month_of(datetime.now() - timedelta(days=FREEZE_GRACE_DAYS))
+        cutoff = _month_start(horizon)
+        self.next_freeze = _month_start(_next_month(horizon)) + timedelta(days=FREEZE_GRACE_DAYS)
+        with self.write_lock:
+            by_month = {}
+            with self.lock:
+                for username, cols in self.logs_by_user.items():
+                    old = cols.split(cols.bounds(end=cutoff)[1])[0]
+                    while old:
+                        month = _month_of(from_us(old.ts[0]))
+                        part = old.slice(end=_month_start(_next_month(month)))
+                        by_month.setdefault(month, {})[username] = part
+                        old = old.split(len(part))[1]
+            if not by_month: return
+            built = {}
+            for month, columns in sorted(by_month.items()):
+                if month in self.frozen:
+                    for username, cols in self._archive(month).by_user().items():
+                        columns[username] = cols.merge(columns.get(username, LogColumns()))
+                built[month] = MonthArchive.build(month, columns)
+                built[month].save(self.archive_dir)
+            with self.lock:
+                for username in list(self.logs_by_user):
+                    cols = self.logs_by_user[username]
+                    n = cols.bounds(end=cutoff)[1]
+                    if n == len(cols): del self.logs_by_user[username]
+                    elif n: self.logs_by_user[username] = cols.split(n)[1]
+                with self.archive_lock:
+                    for month, archive in built.items():
+                        self.frozen[month] = len(archive)
+                        self._cache_archive(month, archive)
+                remaining = self._hot_records()
+            self.log_store.rewrite(remaining)
+            print(f"Đã đóng băng logs các tháng: {', '.join(f'{m:02d}/{y}' for y, m in built)}")
+
+    def append_logs(self, logs):
+        # logs: [(username, action, datetime, phòng hoặc None)]
+        with self.transaction():
+            with self.lock:
+                for username, action, t, room in logs:
+                    rec = [username, ACTION_CODES[action], to_us(t)]
+                    if room is not None: rec.append(room)
+                    self.pending_logs.append(rec)
+                    self.logs_by_user.setdefault(username, LogColumns()).add(rec[2], rec[1], room_code(room))
+
+    def log_slice(self, username, start=None, end=None):
+        # Tìm nhị phân trên chỉ mục, trả về LogColumns trong khoảng [start, end).
+        # Tháng đã đóng băng trong khoảng thì đọc từ archive (nạp nếu chưa có)
+        with self.lock:
+            hot = self.logs_by_user.get(username, LogColumns()).slice(start, end)
+            months = self._frozen_months(start, end)
+        if not months: return hot
+        frozen = LogColumns()
+        for month in months: frozen.extend(self._archive(month).slice(username, start, end))
+        return frozen.merge(hot)
+
+    def log_slices(self, start=None, end=None):
+        # {username: LogColumns} của mọi user trong khoảng [start, end)
+        with self.lock:
+            names = dict.fromkeys(self.logs_by_user)
+            months = self._frozen_months(start, end)
+        for month in months: names.update(dict.fromkeys(self._archive(month).users))
+        result = {}
+        for username in names:
+            cols = self.log_slice(username, start, end)
+            if cols: result[username] = cols
+        return result
+
+    def iter_logs(self):
+        # (username, action, datetime, phòng) của mọi log
+        with self.lock:
+            users = list(self.logs_by_user.items())
+            months = self._frozen_months()
+        for month in months:
+            for username, cols in self._archive(month).by_user().items():
+                for t, a, room in cols.rows(): yield username, a, from_us(t), room
+        for username, cols in users:
+            for t, a, room in cols.rows(): yield username, a, from_us(t), room
+
+    def log_bounds(self):
+        # (đầu, cuối) khoảng thời gian có logs, None nếu chưa có log; dùng để duyệt logs theo tháng.
+        # Tháng đóng băng chỉ biết theo tháng nên lấy đầu / cuối tháng
+        with self.lock:
+            hot = [(cols.ts[0], cols.ts[-1]) for cols in self.logs_by_user.values() if cols]
+            months = sorted(self.frozen)
+        first = [_month_start(months[0])] if months else []
+        last = [_month_start(_next_month(months[-1]))] if months else []
+        if hot:
+            first.append(from_us(min(a for a, _ in hot))); last.append(from_us(max(b for _, b in hot)))
+        return (min(first), max(last)) if first else None
+
+    # --- Khác ---
+    def truncate(self):
+        with self.transaction():
+            self.users_table.truncate()
+            self.logs_table.truncate()
+            self.pending_logs = []
+            self.log_store.clear()
+            with self.lock, self.archive_lock:
+                self.logs_by_user.clear()
+                for month in self.frozen: os.remove(MonthArchive.path(self.archive_dir, month))
+                self.frozen.clear(); self.archives.clear()
+
+    def count_logs(self):
+        with self.lock:
+            return sum(len(cols) for cols in self.logs_by_user.values()) + sum(self.frozen.values())
+
+    def size_bytes(self):
+        archived = sum(os.path.getsize(MonthArchive.path(self.archive_dir, m)) for m in list(self.frozen))
+        return (os.path.getsize(self.path) if os.path.exists(self.path) else 0) + self.log_store.size_bytes() + archived
+
+    def close(self):
+        with self.write_lock:
+            if self.flush_timer: self.flush_timer.cancel(); self.flush_timer = None
+            self.db.close()
+            self.log_store.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT,
+    uid TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_uid ON users(uid);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    action TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    room TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_username_timestamp ON logs(username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp);
+CREATE TABLE IF NOT EXISTS system (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL
+);
+"""
+
+
+def _ts_key(value):
+    # Chuẩn hoá ISO timestamp (luôn có micro giây) để so sánh chuỗi đúng thứ tự thời gian
+    if isinstance(value, str): value = datetime.fromisoformat(value)
+    return value.isoformat(timespec='microseconds')
+
+
+class SQLiteStorage:
+    def __init__(self, path='timekeeper.sqlite3'):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.conn.executescript(SCHEMA)
+        if 'room' not in [row[1] for row in self.conn.execute('PRAGMA table_info(logs)')]:
+            self.conn.execute('ALTER TABLE logs ADD COLUMN room TEXT')
+        # Kết nối riêng cho đọc: WAL cho phép đọc song song trong lúc luồng ghi đang giữ transaction
+        self.reader = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.reader.execute('PRAGMA busy_timeout=5000')
+        self.lock = threading.RLock()
+        self.read_lock = threading.Lock()
+        self.depth = 0
+        self.tx_thread = None
+        self.on_flush = None
+        self.shared = True
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self.depth == 0:
+                self.conn.execute('BEGIN IMMEDIATE')
+                self.tx_thread = threading.current_thread()
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.depth -= 1
+                if self.depth == 0: self.tx_thread = None; self.conn.execute('ROLLBACK')
+                raise
+            self.depth -= 1
+            if self.depth == 0: self.tx_thread = None; self._commit()
+
+    def _wal_size(self):
+        try: return os.path.getsize(self.path + '-wal')
+        except OSError: return 0
+
+    def _commit(self):
+        # Số byte ghi = phần WAL tăng thêm (WAL về 0 sau checkpoint thì lấy kích thước mới)
+        before, start = self._wal_size(), time.perf_counter()
+        self.conn.execute('COMMIT')
+        if self.on_flush:
+            after = self._wal_size()
+            written = after - before if after >= before else after
+            if written: self.on_flush(time.perf_counter() - start, written)
+
+    @contextmanager
+    def _read(self):
+        # Trong transaction phải đọc bằng kết nối ghi để thấy dữ liệu chưa commit
+        if self.tx_thread is threading.current_thread():
+            yield self.conn
+        else:
+            with self.read_lock: yield self.reader
+
+    # --- Users ---
+    def all_users(self):
+        with self._read() as conn:
+            return [(row[0], json.loads(row[1])) for row in conn.execute('SELECT id, data FROM users ORDER BY id')]
+
+    def insert_user(self, data, doc_id=None):
+        with self.transaction():
+            cur = self.conn.execute('INSERT INTO users (id, username, uid, data) VALUES (?, ?, ?, ?)', (doc_id, data.get('username'), data.get('uid'), json.dumps(data, ensure_ascii=False)))
+            return cur.lastrowid
+
+    def update_user(self, doc_id, fields):
+        with self.transaction():
+            row = self.conn.execute('SELECT data FROM users WHERE id = ?', (doc_id,)).fetchone()
+            if not row: return
+            data = json.loads(row[0]); data.update(fields)
+            self.conn.execute('UPDATE users SET username = ?, uid = ?, data = ? WHERE id = ?', (data.get('username'), data.get('uid'), json.dumps(data, ensure_ascii=False), doc_id))
+
+    def update_users(self, updates):
+        # updates: {doc_id: fields}
+        if not updates: return
+        with self.transaction():
+            ids = list(updates)
+            rows = []
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows += self.conn.execute(f'SELECT id, data FROM users WHERE id IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+            params = []
+            for doc_id, raw in rows:
+                data = json.loads(raw); data.update(updates[doc_id])
+                params.append((data.get('username'), data.get('uid'), json.dumps(data, ensure_ascii=False), doc_id))
+            self.conn.executemany('UPDATE users SET username = ?, uid = ?, data = ? WHERE id = ?', params)
+
+    def update_all_users(self, fields):
+        with self.transaction():
+            self.update_users({doc_id: fields for doc_id, _ in self.all_users()})
+
+    def get_user(self, uid=None, username=None):
+        # (doc_id, data) hoặc None
+        column, value = ('uid', uid) if uid is not None else ('username', username)
+        with self._read() as conn:
+            row = conn.execute(f'SELECT id, data FROM users WHERE {column} = ? ORDER BY id LIMIT 1', (value,)).fetchone()
+            return (row[0], json.loads(row[1])) if row else None
+
+    def remove_user(self, doc_id):
+        with self.transaction():
+            self.conn.execute('DELETE FROM users WHERE id = ?', (doc_id,))
+
+    # --- System ---
+    def get_system(self):
+        with self._read() as conn:
+            row = conn.execute('SELECT data FROM system WHERE id = 1').fetchone()
+            return json.loads(row[0]) if row else None
+
+    def set_system(self, fields):
+        with self.transaction():
+            data = self.get_system() or {}
+            data.update(fields)
+            self.conn.execute('INSERT OR REPLACE INTO system (id, data) VALUES (1, ?)', (json.dumps(data),))
+
+    # --- Logs ---
+    # Bảng logs giữ ISO timestamp (so sánh chuỗi theo chỉ mục), đổi sang LogColumns khi đọc ra
+    def append_logs(self, logs):
+        # logs: [(username, action, datetime, phòng hoặc None)]
+        with self.transaction():
+            self.conn.executemany('INSERT INTO logs (username, action, timestamp, room) VALUES (?, ?, ?, ?)', [(u, a, _ts_key(t), r) for u, a, t, r in logs])
+
+    @staticmethod
+    def _columns(rows):
+        # rows: [(action, timestamp, room)]
+        return LogColumns(array('q', (to_us(datetime.fromisoformat(ts)) for _, ts, _ in rows)), array('b', (ACTION_CODES[a] for a, _, _ in rows)),
+                          array('H', (room_code(r) for _, _, r in rows)))
+
+    def log_slice(self, username, start=None, end=None):
+        # Quét theo chỉ mục (username, timestamp)
+        sql, args = 'SELECT action, timestamp, room FROM logs WHERE username = ?', [username]
+        if start: sql += ' AND timestamp >= ?'; args.append(_ts_key(start))
+        if end: sql += ' AND timestamp < ?'; args.append(_ts_key(end))
+        with self._read() as conn:
+            rows = conn.execute(sql + ' ORDER BY timestamp, id', args).fetchall()
+        return self._columns(rows)
+
+    def log_slices(self, start=None, end=None):
+        sql, args = 'SELECT username, action, timestamp, room FROM logs WHERE 1', []
+        if start: sql += ' AND timestamp >= ?'; args.append(_ts_key(start))
+        if end: sql += ' AND timestamp < ?'; args.append(_ts_key(end))
+        with self._read() as conn:
+            rows = conn.execute(sql + ' ORDER BY username, timestamp, id', args).fetchall()
+        grouped = {}
+        for u, a, ts, r in rows: grouped.setdefault(u, []).append((a, ts, r))
+        return {u: self._columns(items) for u, items in grouped.items()}
+
+    def iter_logs(self):
+        with self._read() as conn:
+            rows = conn.execute('SELECT username, action, timestamp, room FROM logs ORDER BY username, timestamp, id').fetchall()
+        for u, a, ts, r in rows:
+            yield u, a, datetime.fromisoformat(ts), r
+
+    def log_bounds(self):
+        with self._read() as conn:
+            row = conn.execute('SELECT MIN(timestamp), MAX(timestamp) FROM logs').fetchone()
+        return (datetime.fromisoformat(row[0]), datetime.fromisoformat(row[1])) if row and row[0] else None
+
+    # --- Khác ---
+    def truncate(self):
+        with self.transaction():
+            self.conn.execute('DELETE FROM users')
+            self.conn.execute('DELETE FROM logs')
+
+    def count_logs(self):
+        with self._read() as conn:
+            return conn.execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+
+    def size_bytes(self):
+        return sum(os.path.getsize(p) for p in (self.path, self.path + '-wal') if os.path.exists(p))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+            self.reader.close()
+
+
+def open_storage(kind=None):
+    kind = kind or os.environ.get('TIMEKEEPER_STORAGE', 'json')
+    if kind == 'sqlite':
+        return SQLiteStorage(os.environ.get('TIMEKEEPER_SQLITE', 'timekeeper.sqlite3'))
+    return JsonStorage(os.environ.get('TIMEKEEPER_DB', 'db.json'), os.environ.get('TIMEKEEPER_LOG_DIR', 'logs'))
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from swipe_cache import SwipeCache
+import db
+import metrics
+import os
+import time
+
+# API cho đầu đọc thẻ, dùng chung cho dashboard (main.py) và dịch vụ nhận quẹt chạy riêng (ingest.py)
+router = APIRouter()
+# Danh sách quyền vào phòng: chỉ process dashboard thấy mọi thay đổi users (sửa/xoá từ trang admin) => chỉ main.py gắn.
+# Chứa mọi UID hợp lệ => đầu đọc phải gửi Authorization: Bearer <TIMEKEEPER_READER_TOKEN>; chưa đặt token thì tắt
+access_router = APIRouter()
+READER_TOKEN = os.environ.get('TIMEKEEPER_READER_TOKEN')
+swipe_cache = SwipeCache()
+
+@router.post('/check')
+async def api_check(request: Request):
+    start = time.perf_counter()
+    try:
+        data = await request.json()
+        uid, room = data.get('uid'), data.get('room')
+        key = request.headers.get('Idempotency-Key') or data.get('id')
+        # Quẹt lặp (thẻ để yên, HTTP gửi lại) trả về quyết định đã cache, không ghi db.
+        # Quyết định + ghi chạy trên luồng ghi của db, event loop không bị chặn bởi I/O
+        status, reason = await swipe_cache.get_or_run(uid, room, key, lambda: db.writer.run(db.process_swipe, uid, room))
+    except: status, reason = 0, 'error'
+    metrics.CHECK_SECONDS.observe(time.perf_counter() - start, reason)
+    return JSONResponse({'status': status})
+
+@router.get('/check/cache')
+def api_check_cache():
+    return JSONResponse(swipe_cache.stats())
+
+@router.post('/check/batch')
+async def api_check_batch(request: Request):
+    # Nhận [{uid, room, ts}, ...] hoặc {'events': [...]}, trả về kết quả theo đúng thứ tự gửi lên
+    # 400 chỉ khi body sai (chưa ghi gì); lỗi của từng lần quẹt nằm trong results
+    try: data = await request.json()
+    except ValueError: return JSONResponse({'results': []}, status_code=400)
+    events = data.get('events', []) if isinstance(data, dict) else data
+    if not isinstance(events, list): return JSONResponse({'results': []}, status_code=400)
+    try: results = await db.writer.run(db.process_swipe_batch, [e if isinstance(e, dict) else {} for e in events])
+    except Exception: return JSONResponse({'results': []}, status_code=500)   # Commit lỗi: không lần quẹt nào được ghi
+    return JSONResponse({'results': results})
+
+@router.get('/metrics')
+def api_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@router.post('/emegency')
+def api_emergency():
+    db.state.set_emergency(True)
+    return JSONResponse({}, status_code=200)
+
+@access_router.get('/access')
+def api_access(request: Request, since: str = None):
+    # Bản đầy đủ {version, lockout, emergency, users: {uid: {rooms, admin?}}}, hoặc với ?since=<version> chỉ các uid
+    # đã đổi (null = đã xoá). Không có gì mới (If-None-Match / since trùng version hiện tại) => 304
+    if not READER_TOKEN or request.headers.get('Authorization') != f'Bearer {READER_TOKEN}':
+        return JSONResponse({'error': 'unauthorized'}, status_code=401)
+    current = db.access.tag()
+    etag = f'"{current}"'
+    if since == current or request.headers.get('If-None-Match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    body = (db.access.delta(since) if since else None) or db.access.snapshot()
+    return JSONResponse(body, headers={'ETag': f'"{body["version"]}"', 'Cache-Control': 'no-cache'})
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# Cache ngắn hạn trước /check:
+#  - Chống dội: cùng thẻ + cùng phòng quẹt lại trong DEBOUNCE_SECONDS (thẻ để yên trên đầu đọc,
+#    HTTP gửi lại) trả về quyết định cũ, không đổi trạng thái, không ghi xuống db.
+#    Mỗi lần trúng cache thì gia hạn cửa sổ, nên thẻ đặt yên không bị vào/ra liên tục.
+#  - Idempotency: client gửi kèm khoá (header Idempotency-Key hoặc trường "id"), gửi lại cùng khoá
+#    trong IDEMPOTENCY_TTL giây nhận lại đúng kết quả lần đầu.
+DEBOUNCE_SECONDS = float(os.environ.get('TIMEKEEPER_DEBOUNCE_SECONDS', 3.0))
+IDEMPOTENCY_TTL = float(os.environ.get('TIMEKEEPER_IDEMPOTENCY_TTL', 300.0))
+MAX_ENTRIES = int(os.environ.get('TIMEKEEPER_SWIPE_CACHE_SIZE', 10000))
+
+
+class TTLCache:
+    # LRU có hạn dùng, giới hạn số phần tử
+    def __init__(self, ttl, max_entries=MAX_ENTRIES, sliding=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sliding = sliding
+        self.items = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key, now):
+        item = self.items.get(key)
+        if item is None: return None
+        expires, value = item
+        if expires < now:
+            del self.items[key]
+            return None
+        if self.sliding: self.items[key] = (now + self.ttl, value)
+        self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value, now):
+        self.items[key] = (now + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_entries:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        self.items.pop(key, None)
+
+
+class SwipeCache:
+    def __init__(self, window=DEBOUNCE_SECONDS, idempotency_ttl=IDEMPOTENCY_TTL, max_entries=MAX_ENTRIES):
+        self.debounce = TTLCache(window, max_entries, sliding=True)
+        self.idempotency = TTLCache(idempotency_ttl, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_run(self, uid, room, key, compute):
+        # Trả về quyết định đã cache nếu có; nếu không thì chạy compute() (đang chạy dở thì chờ chung)
+        now = time.monotonic()
+        caches = [(self.debounce, (uid, room))] if self.debounce.ttl > 0 else []
+        if key: caches.insert(0, (self.idempotency, key))
+        for cache, k in caches:
+            value = cache.get(k, now)
+            if value is not None:
+                self.hits += 1
+                return await asyncio.shield(value) if isinstance(value, asyncio.Future) else value
+        self.misses += 1
+        pending = asyncio.get_running_loop().create_future()
+        for cache, k in caches: cache.put(k, pending, now)
+        try:
+            result = await compute()
+        except BaseException as e:
+            for cache, k in caches: cache.pop(k)
+            pending.set_exception(e); pending.exception()
+            raise
+        pending.set_result(result)
+        now = time.monotonic()
+        for cache, k in caches: cache.put(k, result, now)
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'entries': len(self.debounce.items) + len(self.idempotency.items),
+            'evictions': self.debounce.evictions + self.idempotency.evictions,
+            'debounce_seconds': self.debounce.ttl,
+        }
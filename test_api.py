@@ -1,7 +1,10 @@
+import os
 import requests
 import time
+from access import AccessList
 
 BASE_URL = 'http://localhost:8081'
+READER_HEADERS = {'Authorization': f"Bearer {os.environ.get('TIMEKEEPER_READER_TOKEN', '')}"}
 
 def test_check_api():
     print("Testing /check API...")
@@ -32,6 +35,21 @@ def test_check_api():
         
     print("Done.\n")
 
+def test_check_batch_api():
+    print("Testing /check/batch API...")
+    now = time.time()
+    payload = [
+        {'uid': 'card_001', 'room': 'p1', 'ts': now - 120},
+        {'uid': 'invalid_card', 'room': 'p1', 'ts': now - 90},
+        {'uid': 'card_001', 'room': 'p1', 'ts': now - 60},
+    ]
+    try:
+        res = requests.post(f"{BASE_URL}/check/batch", json=payload)
+        print(f"Batch Request: {res.status_code}, Response: {res.json()}")
+    except Exception as e:
+        print(f"Request failed: {e}")
+    print("Done.\n")
+
 def test_emergency_api():
     print("Testing /emegency API...")
     try:
@@ -41,9 +59,55 @@ def test_emergency_api():
         print(f"Request failed: {e}")
     print("Done.\n")
 
+def test_access_api():
+    print("Testing /access API...")
+    try:
+        res = requests.get(f"{BASE_URL}/access")
+        print(f"Without token: {res.status_code} (expect 401)")
+        res = requests.get(f"{BASE_URL}/access", headers=READER_HEADERS)
+        snapshot = res.json()
+        print(f"Snapshot: {res.status_code}, version={snapshot['version']}, users={len(snapshot['users'])}, ETag={res.headers.get('ETag')}")
+        res = requests.get(f"{BASE_URL}/access", headers=dict(READER_HEADERS, **{'If-None-Match': res.headers.get('ETag')}))
+        print(f"If-None-Match: {res.status_code} (expect 304)")
+        res = requests.get(f"{BASE_URL}/access", headers=READER_HEADERS, params={'since': snapshot['version']})
+        print(f"Delta since current: {res.status_code} (expect 304)")
+    except Exception as e:
+        print(f"Request failed: {e}")
+    print("Done.\n")
+
+def test_access_list():
+    # Chạy trên server (không cần HTTP): bản đầy đủ, delta, xoá uid, version cũ / của lần chạy khác
+    print("Testing AccessList...")
+    acl = AccessList((20, 5), max_changes=2)
+    acl.reset([{'uid': 'a', 'allowed_rooms': ['p1']}, {'uid': 'b', 'allowed_rooms': ['p2'], 'role': 'admin'}], False)
+    snap = acl.snapshot()
+    assert snap['full'] and snap['users'] == {'a': {'rooms': ['p1']}, 'b': {'rooms': ['p2'], 'admin': 1}}
+    v1 = snap['version']
+    assert acl.delta(v1)['users'] == {}
+    acl.set_user({'uid': 'a', 'allowed_rooms': ['p1']})                 # Không đổi gì => không tăng version
+    assert acl.tag() == v1
+    acl.set_user({'uid': 'a', 'allowed_rooms': ['p1', 'p3']})
+    acl.remove('b')
+    delta = acl.delta(v1)
+    assert not delta['full'] and delta['users'] == {'a': {'rooms': ['p1', 'p3']}, 'b': None}
+    assert acl.snapshot()['users'] == {'a': {'rooms': ['p1', 'p3']}}
+    v2 = acl.tag()
+    acl.set_emergency(True)
+    delta = acl.delta(v2)
+    assert delta['emergency'] and delta['users'] == {}
+    acl.set_user({'uid': 'c', 'allowed_rooms': []})
+    acl.set_user({'uid': 'd', 'allowed_rooms': []})
+    assert acl.delta(v1) is None                                        # Quá max_changes: phải lấy bản đầy đủ
+    assert acl.delta('other.' + v1.split('.')[1]) is None               # Version của lần chạy server khác
+    assert acl.delta(acl.tag() + '0') is None and acl.delta('garbage') is None
+    print("Done.\n")
+
 if __name__ == '__main__':
+    test_access_list()
     print("Ensure the server is running on localhost:8081 before running this script.")
     test_check_api()
+    test_check_batch_api()
+    test_access_api()
     
     val = input("Do you want to trigger Emergency mode? (y/n): ")
     if val.lower() == 'y':
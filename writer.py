@@ -0,0 +1,119 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
+
+# Luồng ghi duy nhất: mọi thao tác ghi được xếp hàng và chạy tuần tự trên 1 thread riêng.
+# Các thao tác đang chờ được gom vào 1 transaction => nhiều lần quẹt thẻ chỉ tốn 1 lần ghi đĩa.
+MAX_BATCH = 256
+
+
+class Writer:
+    def __init__(self, transaction, max_batch=MAX_BATCH):
+        self.transaction = transaction
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.closed = False
+        self.local = threading.local()
+        self.thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def in_writer(self):
+        return threading.current_thread() is self.thread or getattr(self.local, 'depth', 0) > 0
+
+    @contextmanager
+    def exclusive(self):
+        # Mở transaction ngay trên luồng hiện tại (vd. script seed dữ liệu): các thao tác ghi
+        # bên trong chạy trực tiếp, luồng ghi chính phải chờ tới khi commit xong
+        owner = getattr(self.local, 'hooks', None) is None
+        if owner: self.local.hooks = []
+        try:
+            with self.transaction():
+                self.local.depth = getattr(self.local, 'depth', 0) + 1
+                try:
+                    yield
+                finally:
+                    self.local.depth -= 1
+        except BaseException:
+            if owner: self.local.hooks = None
+            raise
+        if owner: self._run_hooks()
+
+    def after_commit(self, fn, *args):
+        # Chạy fn sau khi transaction đang mở commit xong (bỏ đi nếu rollback), ngoài transaction thì chạy luôn
+        hooks = getattr(self.local, 'hooks', None)
+        if hooks is None: fn(*args)
+        else: hooks.append((fn, args))
+
+    def _run_hooks(self):
+        hooks, self.local.hooks = self.local.hooks, None
+        for fn, args in hooks:
+            try: fn(*args)
+            except Exception as e: print(f"Lỗi sau commit: {e}")
+
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        self.queue.put((fn, args, kwargs, fut))
+        return fut
+
+    async def run(self, fn, *args, **kwargs):
+        # Dùng trong handler async: không chặn event loop trong lúc chờ ghi
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def call(self, fn, *args, **kwargs):
+        # Gọi đồng bộ: chạy luôn nếu đang ở luồng ghi, ngược lại xếp hàng và chờ kết quả
+        if self.closed or self.in_writer(): return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def serialized(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            job = self.queue.get()
+            if job is None: break
+            jobs = [job]
+            while len(jobs) < self.max_batch:
+                try: job = self.queue.get_nowait()
+                except queue.Empty: break
+                if job is None: stop = True; break
+                jobs.append(job)
+            self._run_batch(jobs)
+
+    def _run_batch(self, jobs):
+        # Kết quả chỉ trả về sau khi commit xong
+        # Sự kiện (after_commit) của các thao tác cũng chỉ được gửi sau khi commit, rollback thì bỏ
+        done = []
+        self.local.hooks = []
+        try:
+            with self.transaction():
+                for fn, args, kwargs, fut in jobs:
+                    if not fut.set_running_or_notify_cancel(): continue
+                    try: done.append((fut, fn(*args, **kwargs), None))
+                    except Exception as e: done.append((fut, None, e))
+        except Exception as e:
+            self.local.hooks = None
+            for fut, _, _ in done: fut.set_exception(e)
+            for _, _, _, fut in jobs:
+                if not fut.done(): fut.set_exception(e)
+            return
+        self._run_hooks()
+        for fut, result, error in done:
+            if error is not None: fut.set_exception(error)
+            else: fut.set_result(result)
+
+    def close(self):
+        if self.closed: return
+        self.queue.put(None)
+        self.thread.join()
+        self.closed = True
+        # Chạy nốt các thao tác xếp hàng sau tín hiệu dừng
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if job: self._run_batch([job])